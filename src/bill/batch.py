@@ -0,0 +1,147 @@
+from bill.images import load_image
+from bill.receipts import Items, Receipt
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from pydantic import BaseModel
+from logging import getLogger
+import click
+import csv
+import os
+import sys
+
+log = getLogger(__file__)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff"}
+COMBINED_CSV_FILE = "receipts.csv"
+
+
+class ReceiptResult(BaseModel):
+    image: str
+    items: Items
+    extras: Items
+
+
+def find_images(receipts_directory: Path) -> list[Path]:
+    return sorted(
+        path
+        for path in receipts_directory.iterdir()
+        if path.is_file() and path.suffix.lower() in IMAGE_SUFFIXES
+    )
+
+
+def get_result_path(output_directory: Path, image_path: Path) -> Path:
+    return output_directory / f"{image_path.name}.json"
+
+
+def process_receipt(image_path: Path, result_path: Path) -> ReceiptResult:
+    """
+    Extract a receipt image and write its items and extras to result_path.
+
+    The file is written under a temporary name and renamed, so a receipt that fails
+    or is interrupted part way leaves no result behind and is redone on resume.
+    """
+    receipt_data = Receipt(load_image(image_path)).extract()
+    result = ReceiptResult(
+        image=image_path.name,
+        items=receipt_data.get_items(),
+        extras=receipt_data.get_extras(),
+    )
+
+    temporary_path = result_path.with_suffix(".tmp")
+    temporary_path.write_text(result.model_dump_json(indent=4))
+    temporary_path.replace(result_path)
+    return result
+
+
+def write_combined_csv(results: list[ReceiptResult], csv_path: Path):
+    with open(csv_path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(["Receipt", "Type", "Name", "Price"])
+        for result in results:
+            for kind, items in (("item", result.items), ("extra", result.extras)):
+                for item in items.items:
+                    writer.writerow(
+                        [result.image, kind, item.name, f"{item.price:.2f}"]
+                    )
+
+
+@click.command()
+@click.argument(
+    "receipts_directory",
+    type=click.Path(exists=True, file_okay=False, path_type=Path),
+)
+@click.argument("output_directory", type=click.Path(file_okay=False, path_type=Path))
+@click.option(
+    "--workers",
+    default=int(os.environ.get("ANALYSIS_WORKERS", "4")),
+    show_default=True,
+    help="Receipts processed at once.",
+)
+@click.option(
+    "--resume/--no-resume",
+    default=True,
+    show_default=True,
+    help="Skip receipts that already have a result in OUTPUT_DIRECTORY.",
+)
+def process_receipts(
+    receipts_directory: Path, output_directory: Path, workers: int, resume: bool
+):
+    """
+    Extract every receipt image in RECEIPTS_DIRECTORY.
+
+    Writes the items and extras of each receipt to OUTPUT_DIRECTORY/<image>.json, and
+    those of all receipts to OUTPUT_DIRECTORY/receipts.csv. Receipts that fail are
+    reported and left out, so running the command again only retries those.
+    """
+    output_directory.mkdir(parents=True, exist_ok=True)
+    image_paths = find_images(receipts_directory)
+
+    pending_paths = [
+        image_path
+        for image_path in image_paths
+        if not (resume and get_result_path(output_directory, image_path).exists())
+    ]
+    click.echo(
+        f"{len(image_paths)} receipts, {len(image_paths) - len(pending_paths)} already done"
+    )
+
+    failures = []
+    with (
+        ThreadPoolExecutor(max_workers=workers) as executor,
+        click.progressbar(length=len(pending_paths), label="Receipts") as progress,
+    ):
+        jobs = {
+            executor.submit(
+                process_receipt,
+                image_path,
+                get_result_path(output_directory, image_path),
+            ): image_path
+            for image_path in pending_paths
+        }
+        for job in as_completed(jobs):
+            image_path = jobs[job]
+            try:
+                job.result()
+            except Exception as e:
+                log.debug(f"Failed to process {image_path}: {e}")
+                failures.append((image_path, e))
+            progress.update(1)
+
+    results = []
+    for image_path in image_paths:
+        result_path = get_result_path(output_directory, image_path)
+        if result_path.exists():
+            results.append(ReceiptResult.model_validate_json(result_path.read_text()))
+    write_combined_csv(results, output_directory / COMBINED_CSV_FILE)
+    click.echo(
+        f"Wrote {len(results)} receipts to {output_directory / COMBINED_CSV_FILE}"
+    )
+
+    if failures:
+        for image_path, error in failures:
+            click.echo(f"Failed {image_path.name}: {error}", err=True)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    process_receipts()
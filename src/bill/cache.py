@@ -0,0 +1,140 @@
+from pathlib import Path
+from logging import getLogger
+from tempfile import NamedTemporaryFile
+import hashlib
+import json
+import os
+import time
+
+log = getLogger(__file__)
+
+CACHE_DIRECTORY = "RECEIPT_CACHE_DIRECTORY"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 60 * 60
+
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk cache of receipt extraction results.
+
+    Entries are JSON files named by a hash of the image data, the model and the
+    prompt version, so the same image is only ever sent to the model once. Reading
+    an entry refreshes its modification time, and entries are evicted least recently
+    used first once the cache outgrows max_bytes, or when older than max_age.
+    """
+
+    def __init__(
+        self,
+        directory: os.PathLike,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: float = DEFAULT_MAX_AGE,
+    ):
+        """
+        Initialize the cache in a directory, creating it if needed.
+
+        Parameters
+        ----------
+        directory : os.PathLike
+            Directory holding the cache entries.
+        max_bytes : int
+            Total size of entries to keep.
+        max_age : float
+            Seconds since an entry was last used before it expires.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    @classmethod
+    def from_environment(cls) -> "ExtractionCache | None":
+        """
+        Get the cache in RECEIPT_CACHE_DIRECTORY, or None if it is not set.
+        """
+        directory = os.environ.get(CACHE_DIRECTORY)
+        return cls(directory) if directory else None
+
+    @staticmethod
+    def get_key(image_data: bytes, model: str, prompt_version: str) -> str:
+        """
+        Get the cache key of an image extracted with a model and prompt version.
+        """
+        digest = hashlib.sha256()
+        for part in (model.encode(), prompt_version.encode(), image_data):
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get_path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> str | None:
+        """
+        Get a cached entry, or None if it is missing, expired or not readable JSON.
+
+        An entry that cannot be read, such as one cut short by a full disk, is
+        deleted so it is written again.
+        """
+        path = self.get_path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                return None
+            value = path.read_text()
+            json.loads(value)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning(f"Deleting unreadable extraction cache entry {key}: {e}")
+            self.delete(key)
+            return None
+
+        log.debug(f"Extraction cache hit {key}")
+        return value
+
+    def put(self, key: str, value: str):
+        """
+        Store an entry and evict entries over the size or age limits.
+
+        The entry is written to a temporary file of its own and renamed, so readers
+        and other writers of the same key never see part of it.
+        """
+        with NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False
+        ) as temporary_file:
+            temporary_path = Path(temporary_file.name)
+            try:
+                temporary_file.write(value)
+            except BaseException:
+                temporary_file.close()
+                temporary_path.unlink(missing_ok=True)
+                raise
+        temporary_path.replace(self.get_path(key))
+        self.evict()
+
+    def delete(self, key: str):
+        self.get_path(key).unlink(missing_ok=True)
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used until under max_bytes.
+        """
+        now = time.time()
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_bytes -= size
@@ -1,9 +1,12 @@
 import csv
 from io import StringIO, BytesIO
-from typing import Iterable
+from typing import BinaryIO, Iterable, Iterator
 from bill.person import Person
 from bill.receipts import Items, Item
+from bill.settlement import ShareChange, compile_settlement
 from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+import os
 
 
 class Calculator:
@@ -11,7 +14,13 @@ class Calculator:
     A calculator for splitting bills among persons based on items and extras.
     """
 
-    def __init__(self, persons: list[Person], items: Items, extras: Items):
+    def __init__(
+        self,
+        persons: list[Person],
+        items: Items,
+        extras: Items,
+        backend: str = "python",
+    ):
         """
         Initialize the calculator with persons, items, and extras.
 
@@ -23,10 +32,14 @@ class Calculator:
             Items object containing the main items to be split
         extras: Items
             Items object containing additional items (tax, tip, etc.) to be split
+        backend: str
+            Settlement backend, "python" (default), "numpy" for large groups or
+            "cents" for exact integer-cent allocation
         """
         self.persons = persons
         self.items = items
         self.extras = extras
+        self.settlement = compile_settlement(persons, items, extras, backend)
 
     def get_split_count(self, item: Item) -> int:
         """
@@ -42,8 +55,7 @@ class Calculator:
         int
             The number of persons who have this item
         """
-        item_index = self.items.items.index(item)
-        return sum(1 for person in self.persons if item_index in person.items)
+        return self.settlement.get_split_count(self.settlement.item_index(item))
 
     def get_person_share(self, item: Item, person: Person) -> float:
         """
@@ -61,13 +73,9 @@ class Calculator:
         float
             The person's share of the item price (0.0 if person doesn't have this item)
         """
-        item_index = self.items.items.index(item)
-
-        if item_index in person.items:
-            split_count = self.get_split_count(item)
-            return item.price / split_count
-        else:
-            return 0.0
+        return self.settlement.get_share(
+            self.settlement.item_index(item), self.settlement.person_index(person)
+        )
 
     def get_person_subtotal(self, person: Person) -> float:
         """
@@ -83,8 +91,7 @@ class Calculator:
         float
             The person's subtotal (sum of their shares of all items)
         """
-        shares = map(lambda item: self.get_person_share(item, person), self.items.items)
-        return sum(shares)
+        return self.settlement.get_subtotal(self.settlement.person_index(person))
 
     def get_person_extra(self, extra: Item, person: Person) -> float:
         """
@@ -102,9 +109,7 @@ class Calculator:
         float
             The person's share of the extra item based on their proportional share of the bill
         """
-        receipt_subtotal = self.items.get_sum()
-        person_ratio = self.get_person_subtotal(person) / receipt_subtotal
-        return extra.price * person_ratio
+        return self.settlement.get_extra(extra, self.settlement.person_index(person))
 
     def get_person_total(self, person: Person) -> float:
         """
@@ -120,11 +125,26 @@ class Calculator:
         float
             The person's total amount (subtotal + all extras)
         """
-        person_subtotal = self.get_person_subtotal(person)
-        person_extras = map(
-            lambda extra: self.get_person_extra(extra, person), self.extras.items
-        )
-        return person_subtotal + sum(person_extras)
+        return self.settlement.get_person_total(self.settlement.person_index(person))
+
+    def update_item(self, person_index: int, item_index: int) -> list[ShareChange]:
+        """
+        Toggle an item for a person and recalculate only what the toggle affects.
+
+        Parameters
+        ----------
+        person_index: int
+            Index of the person toggling the item
+        item_index: int
+            Index of the item being toggled
+
+        Returns
+        -------
+        list[ShareChange]
+            Updated share, subtotal, extras and total of every person sharing the
+            item before or after the toggle
+        """
+        return self.settlement.toggle(person_index, item_index)
 
     def get_person_shares(self, person: Person) -> "Iterable[tuple[Item, float]]":
         """
@@ -140,70 +160,96 @@ class Calculator:
         Iterable[tuple[Item, float]]
             A lazy iterable yielding (Item, share) tuples for each item in self.items.items.
         """
-        return map(
-            lambda item: (item, self.get_person_share(item, person)), self.items.items
-        )
+        person_index = self.settlement.person_index(person)
+        return zip(self.items.items, self.settlement.get_person_shares(person_index))
 
-    def get_shares_csv(self):
+    def get_share_rows(self) -> "Iterator[list[str]]":
         """
-        Get a CSV string of shares for each person.
+        Lazily yield the formatted rows of the shares table.
+
+        Each row is read straight from the compiled settlement, so only one row
+        exists in memory at a time.
+
+        Returns
+        -------
+        Iterator[list[str]]
+            The header, one row per item, the subtotal, one row per extra and the
+            total, each as [name, receipt, *person shares, check]
         """
 
-        def get_person_shares(get_share):
-            return [get_share(person) for person in self.persons]
+        def format_share(share: float) -> str:
+            return f"{share:.2f}" if share else ""
 
-        fieldnames = (
-            ["Item", "Receipt"] + [person.name for person in self.persons] + ["Check"]
-        )
+        person_count = len(self.persons)
 
-        output = StringIO()
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for item in self.items.items:
-            row = {"Item": item.name, "Receipt": f"{item.price:.2f}"}
-            for person in self.persons:
-                share = self.get_person_share(item, person)
-                row[person.name] = f"{share:.2f}" if share else ""
-            row["Check"] = ""
-            writer.writerow(row)
+        yield ["Item", "Receipt"] + [person.name for person in self.persons] + ["Check"]
+
+        for item_index, item in enumerate(self.items.items):
+            item_shares = self.settlement.get_item_shares(item_index)
+            yield [item.name, f"{item.price:.2f}"] + [
+                format_share(share) for share in item_shares
+            ] + [""]
 
         subtotal = self.items.get_sum()
-        person_subtotals = get_person_shares(self.get_person_subtotal)
-        subtotal_row = {"Item": "Subtotal", "Receipt": f"{subtotal:.2f}"}
-        for person, share in zip(self.persons, person_subtotals):
-            subtotal_row[person.name] = f"{share:.2f}"
-        subtotal_row["Check"] = f"{sum(person_subtotals):.2f}"
-        writer.writerow(subtotal_row)
+        person_subtotals = [
+            self.settlement.get_subtotal(i) for i in range(person_count)
+        ]
+        yield ["Subtotal", f"{subtotal:.2f}"] + [
+            f"{share:.2f}" for share in person_subtotals
+        ] + [f"{sum(person_subtotals):.2f}"]
 
         for extra in self.extras.items:
-            extra_shares = get_person_shares(
-                lambda person: self.get_person_extra(extra, person)
-            )
-            extra_row = {"Item": extra.name, "Receipt": f"{extra.price:.2f}"}
-            for person, share in zip(self.persons, extra_shares):
-                extra_row[person.name] = f"{share:.2f}" if share else ""
-            extra_row["Check"] = f"{sum(extra_shares):.2f}"
-            writer.writerow(extra_row)
+            extra_shares = self.settlement.get_extra_shares(extra)
+            yield [extra.name, f"{extra.price:.2f}"] + [
+                format_share(share) for share in extra_shares
+            ] + [f"{sum(extra_shares):.2f}"]
 
         total = subtotal + sum(extra.price for extra in self.extras.items)
-        person_totals = get_person_shares(self.get_person_total)
-        total_row = {"Item": "Total", "Receipt": f"{total:.2f}"}
-        for person, share in zip(self.persons, person_totals):
-            total_row[person.name] = f"{share:.2f}"
-        total_row["Check"] = f"{sum(person_totals):.2f}"
-        writer.writerow(total_row)
+        person_totals = [
+            self.settlement.get_person_total(i) for i in range(person_count)
+        ]
+        yield ["Total", f"{total:.2f}"] + [
+            f"{share:.2f}" for share in person_totals
+        ] + [f"{sum(person_totals):.2f}"]
+
+    def iter_shares_csv(self) -> "Iterator[str]":
+        """
+        Lazily yield the CSV of shares for each person, one line at a time.
 
-        output.seek(0)
-        return output.getvalue()
+        Returns
+        -------
+        Iterator[str]
+            CSV lines, suitable for a streamed response
+        """
+        output = StringIO()
+        writer = csv.writer(output)
 
-    def get_shares_spreadsheet(self):
+        for row in self.get_share_rows():
+            writer.writerow(row)
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    def get_shares_csv(self):
         """
-        Get an Excel spreadsheet (BytesIO) with formulas for calculating shares.
+        Get a CSV string of shares for each person.
+        """
+        return "".join(self.iter_shares_csv())
+
+    def write_shares_spreadsheet(self, output: "BinaryIO | os.PathLike"):
+        """
+        Write an Excel spreadsheet with formulas for calculating shares.
+
+        The workbook is written in openpyxl's write-only mode, so rows are streamed
+        to the output instead of being held in memory as cells.
+
+        Parameters
+        ----------
+        output: BinaryIO | os.PathLike
+            Binary file object or path to write the .xlsx to
         """
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Bill Split"
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet("Bill Split")
 
         fieldnames = (
             ["Item", "Receipt"] + [person.name for person in self.persons] + ["Check"]
@@ -212,13 +258,15 @@ class Calculator:
         worksheet.append(fieldnames)
         current_row = 2
 
-        for item in self.items.items:
-            row_data = [item.name, item.price]
-            split_count = self.get_split_count(item)
-            item_index = self.items.items.index(item)
+        person_count = len(self.persons)
+        person_columns = [get_column_letter(3 + i) for i in range(person_count)]
+        last_person_col = get_column_letter(2 + person_count)
 
-            for person in self.persons:
-                if item_index in person.items:
+        for item_index, item in enumerate(self.items.items):
+            row_data = [item.name, item.price]
+            split_count = self.settlement.get_split_count(item_index)
+            for person_index in range(person_count):
+                if self.settlement.is_sharing(item_index, person_index):
                     formula = f"=$B{current_row}/{split_count}"
                     row_data.append(formula)
                 else:
@@ -229,12 +277,9 @@ class Calculator:
 
         subtotal_row = current_row
         subtotal = self.items.get_sum()
-        person_count = len(self.persons)
-        last_person_col = chr(ord("C") + person_count - 1)
 
         row_data = ["Subtotal", subtotal]
-        for col_idx in range(person_count):
-            col_letter = chr(ord("C") + col_idx)
+        for col_letter in person_columns:
             formula = f"=SUM({col_letter}2:{col_letter}{current_row - 1})"
             row_data.append(formula)
         row_data.append(f"=SUM(C{current_row}:{last_person_col}{current_row})")
@@ -250,8 +295,7 @@ class Calculator:
             extra_name_with_percentage = f"{extra.name} ({formatted_percentage})"
 
             row_data = [extra_name_with_percentage, extra.price]
-            for col_idx in range(person_count):
-                col_letter = chr(ord("C") + col_idx)
+            for col_letter in person_columns:
                 formula = (
                     f"=({col_letter}{subtotal_row}/$B${subtotal_row})*$B{current_row}"
                 )
@@ -263,14 +307,19 @@ class Calculator:
         total_row = current_row
         row_data = ["Total"]
         row_data.append(f"=SUM(B{subtotal_row}:B{current_row - 1})")
-        for col_idx in range(person_count):
-            col_letter = chr(ord("C") + col_idx)
+        for col_letter in person_columns:
             formula = f"=SUM({col_letter}{subtotal_row}:{col_letter}{current_row - 1})"
             row_data.append(formula)
         row_data.append(f"=SUM(C{total_row}:{last_person_col}{total_row})")
         worksheet.append(row_data)
 
-        output = BytesIO()
         workbook.save(output)
+
+    def get_shares_spreadsheet(self):
+        """
+        Get an Excel spreadsheet (BytesIO) with formulas for calculating shares.
+        """
+        output = BytesIO()
+        self.write_shares_spreadsheet(output)
         output.seek(0)
         return output
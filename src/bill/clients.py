@@ -0,0 +1,154 @@
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from logging import getLogger
+from threading import Lock
+from weakref import WeakKeyDictionary
+import asyncio
+import httpx
+import os
+
+log = getLogger(__file__)
+
+
+class ClientSettings:
+    """
+    Server, connection pool, timeout and retry settings of the inference clients.
+
+    Defaults come from the environment:
+    INFERENCE_BASE_URL, INFERENCE_MAX_CONNECTIONS, INFERENCE_KEEPALIVE_EXPIRY,
+    INFERENCE_TIMEOUT, INFERENCE_CONNECT_TIMEOUT and INFERENCE_MAX_RETRIES.
+    """
+
+    def __init__(self):
+        # Any OpenAI-compatible server, such as a local stand-in; None for OpenAI
+        self.base_url = os.environ.get("INFERENCE_BASE_URL") or None
+        self.max_connections = int(os.environ.get("INFERENCE_MAX_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(
+            os.environ.get("INFERENCE_KEEPALIVE_EXPIRY", "60")
+        )
+        self.timeout = float(os.environ.get("INFERENCE_TIMEOUT", "120"))
+        self.connect_timeout = float(os.environ.get("INFERENCE_CONNECT_TIMEOUT", "10"))
+        self.max_retries = int(os.environ.get("INFERENCE_MAX_RETRIES", "2"))
+
+    def get_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def get_timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.timeout, connect=self.connect_timeout)
+
+
+_settings = ClientSettings()
+_client: OpenAI | None = None
+_async_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = (
+    WeakKeyDictionary()
+)
+_lock = Lock()
+
+
+def configure(
+    base_url: str | None = None,
+    max_connections: int | None = None,
+    keepalive_expiry: float | None = None,
+    timeout: float | None = None,
+    connect_timeout: float | None = None,
+    max_retries: int | None = None,
+):
+    """
+    Change the client settings. Clients created afterwards use the new settings.
+
+    Parameters
+    ----------
+    base_url : str | None
+        URL of an OpenAI-compatible server to use instead of OpenAI.
+    max_connections : int | None
+        Connections kept open to the inference API.
+    keepalive_expiry : float | None
+        Seconds an idle connection is kept alive.
+    timeout : float | None
+        Seconds to wait for a response.
+    connect_timeout : float | None
+        Seconds to wait for a connection.
+    max_retries : int | None
+        Times a failed request is retried, with the SDK's exponential backoff.
+    """
+    global _client
+
+    with _lock:
+        for name, value in (
+            ("base_url", base_url),
+            ("max_connections", max_connections),
+            ("keepalive_expiry", keepalive_expiry),
+            ("timeout", timeout),
+            ("connect_timeout", connect_timeout),
+            ("max_retries", max_retries),
+        ):
+            if value is not None:
+                setattr(_settings, name, value)
+
+        _client = None
+        _async_clients.clear()
+
+
+def get_call_timeout() -> float:
+    """
+    Get the seconds an inference call may take with all of its retries, after which
+    a caller waiting for it should give up.
+    """
+    return _settings.timeout * (_settings.max_retries + 1)
+
+
+def get_client() -> OpenAI:
+    """
+    Get the process-wide OpenAI client.
+
+    The client is created on first use and shared by every thread, so requests reuse
+    its pool of kept-alive connections instead of opening a new one per receipt.
+    """
+    global _client
+
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.environ["INFERENCE_API_TOKEN"],
+                    base_url=_settings.base_url,
+                    timeout=_settings.get_timeout(),
+                    max_retries=_settings.max_retries,
+                    http_client=DefaultHttpxClient(limits=_settings.get_limits()),
+                )
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Get the AsyncOpenAI client of the running event loop.
+
+    Async connections cannot be shared between event loops, so there is one client
+    per loop, shared by every task on it.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=os.environ["INFERENCE_API_TOKEN"],
+                base_url=_settings.base_url,
+                timeout=_settings.get_timeout(),
+                max_retries=_settings.max_retries,
+                http_client=DefaultAsyncHttpxClient(limits=_settings.get_limits()),
+            )
+            _async_clients[loop] = client
+    return client
+
+
+def warm_client():
+    """
+    Open a connection to the inference API ahead of the first receipt.
+    """
+    try:
+        get_client().models.list()
+    except Exception as e:
+        log.warning(f"Could not warm inference client: {e}")
@@ -1,34 +1,458 @@
-from PIL import Image
+from PIL import Image, ImageChops, ImageFilter, ImageOps, ImageStat
 from logging import getLogger
-from math import ceil
+from math import ceil, floor, log10, radians, sin, sqrt
 import io
 import os
 
 log = getLogger(__file__)
 
+MAX_IMAGE_DATA_SIZE = 1024 * 1024 * 5
 
-def get_image_data(image: Image) -> bytes:
+# Side of the downscaled probe encoded to estimate the data size per pixel
+PROBE_SCALE = 0.25
+
+# Aim a little under the budget, as the estimate of the data size is not exact
+SCALE_MARGIN = 0.97
+
+# Formats tried for an upload, and the least peak signal-to-noise ratio in dB the
+# encoded image must keep against the original
+IMAGE_FORMATS = os.environ.get("IMAGE_FORMATS", "WEBP,JPEG").upper().split(",")
+IMAGE_MIN_PSNR = float(os.environ.get("IMAGE_MIN_PSNR", "40"))
+
+# Qualities tried for the lossy formats, lowest first
+QUALITIES = (50, 60, 70, 80, 90)
+
+# Largest side of the image the format and quality are chosen on
+CHOICE_SIZE = 1024
+
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Receipts are cropped, straightened and turned grayscale before encoding unless 0
+IMAGE_PREPROCESS = os.environ.get("IMAGE_PREPROCESS", "1") != "0"
+
+# Longest side worth sending; the model scales larger images down to fit 2048 pixels
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "2048"))
+
+# Largest side of the image the receipt is found and straightened on
+ANALYSIS_SIZE = 512
+
+# A JPEG may be decoded at a reduced scale that keeps this fraction of IMAGE_MAX_SIDE
+# for the receipt, as the decoder only scales by halves
+DRAFT_TOLERANCE = 0.95
+
+# Scale a JPEG is first decoded at to find the receipt, the smallest the decoder has
+PROBE_DRAFT_SCALE = 1 / 8
+
+# Rotations tried to straighten the receipt, in degrees
+DESKEW_ANGLES = [step / 2 for step in range(-10, 11)]
+
+# How many times the line contrast at 0 degrees a rotation must reach to be applied
+DESKEW_MIN_GAIN = 1.1
+
+# Crop margin around the receipt, as a fraction of its size
+CROP_MARGIN = 0.02
+
+# Least fraction of the image the found receipt must cover to be cropped to
+MIN_CROP_AREA = 0.2
+
+
+class CompressedImage:
+    """
+    An image resized to fit a data size budget, with its encoded data.
+    """
+
+    def __init__(
+        self,
+        image: Image.Image,
+        data: bytes,
+        encode_count: int,
+        format: str = "PNG",
+    ):
+        self.image = image
+        self.data = data
+        self.encode_count = encode_count
+        self.format = format
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+
+def get_image_data(
+    image: Image, format: str = "PNG", quality: int | None = None
+) -> bytes:
     buffer = io.BytesIO()
-    image.save(buffer, format="PNG")
+    if quality is None:
+        image.save(buffer, format=format)
+    else:
+        image.save(buffer, format=format, quality=quality)
     return buffer.getvalue()
 
 
-def compress(image: Image, max_data_size: int) -> Image:
-    image = image.convert("RGB")
+def get_mime_type(image_data: bytes) -> str:
+    """
+    Get the MIME type of encoded image data from its signature.
+    """
+    if image_data.startswith(b"\xff\xd8\xff"):
+        return MIME_TYPES["JPEG"]
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return MIME_TYPES["WEBP"]
+    return MIME_TYPES["PNG"]
+
+
+def get_psnr(image: Image, other_image: Image) -> float:
+    """
+    Get the peak signal-to-noise ratio in dB of other_image against an image of the
+    same mode.
+    """
+    squares = ImageStat.Stat(ImageChops.difference(image, other_image)).sum2
+    mean_square_error = sum(squares) / (len(squares) * image.width * image.height)
+    if mean_square_error == 0:
+        return float("inf")
+    return 10 * log10(255**2 / mean_square_error)
+
+
+def choose_encoding(
+    image: Image,
+    formats: list[str] = IMAGE_FORMATS,
+    min_psnr: float = IMAGE_MIN_PSNR,
+) -> tuple[str, int | None]:
+    """
+    Choose the format and quality giving the smallest data that keeps min_psnr.
+
+    Each lossy format is tried from the lowest quality up, since data only grows
+    with quality, so the first quality that keeps min_psnr is its smallest.
+
+    Parameters
+    ----------
+    image : Image
+        RGB or grayscale image to choose for, best downscaled as it is encoded once
+        per try.
+    formats : list[str]
+        Formats to try, of PNG, JPEG and WEBP.
+    min_psnr : float
+        Least peak signal-to-noise ratio in dB to keep against the image.
+
+    Returns
+    -------
+    tuple[str, int | None]
+        The format, and the quality or None for PNG. PNG if no lossy format keeps
+        min_psnr.
+    """
+    candidates = []
+    for format in formats:
+        if format == "PNG":
+            candidates.append((len(get_image_data(image)), format, None))
+            continue
+
+        for quality in QUALITIES:
+            image_data = get_image_data(image, format, quality)
+            decoded_image = Image.open(io.BytesIO(image_data)).convert(image.mode)
+            if get_psnr(image, decoded_image) >= min_psnr:
+                candidates.append((len(image_data), format, quality))
+                break
+
+    if not candidates:
+        return "PNG", None
+
+    data_size, format, quality = min(candidates)
+    log.debug(f"Chose {format} at quality {quality}, {data_size} bytes on probe")
+    return format, quality
+
+
+def resize(image: Image, scale: float) -> Image:
+    width = max(1, floor(image.width * scale))
+    height = max(1, floor(image.height * scale))
+    return image.resize((width, height), Image.Resampling.HAMMING)
+
+
+def compress(
+    image: Image,
+    max_data_size: int,
+    format: str = "PNG",
+    quality: int | None = None,
+) -> CompressedImage:
+    """
+    Resize an image to about the largest size whose encoded data fits in max_data_size.
+
+    An image whose raw pixels fit in the budget is encoded as is. Otherwise, since
+    encoded data grows about in proportion to the pixel count, the scale needed is
+    predicted from the data size per pixel of a quarter-side probe rather than found
+    by shrinking a step at a time. Any further try is resized from the original image
+    with the scale corrected by the size of the last encode, so the budget is usually
+    met by the second encode.
+
+    Parameters
+    ----------
+    image : Image
+        The image to compress.
+    max_data_size : int
+        The largest encoded data size allowed, in bytes.
+    format : str
+        Format to encode in, PNG, JPEG or WEBP.
+    quality : int | None
+        Quality of the lossy formats, or None for the default of the format.
+
+    Returns
+    -------
+    CompressedImage
+        The resized image, its encoded data and the number of encodes it took.
+    """
+    original_image = image if image.mode in ("L", "RGB") else image.convert("RGB")
+    pixel_count = original_image.width * original_image.height
+    band_count = len(original_image.getbands())
+
+    scale = 1.0
+    encode_count = 0
+    if pixel_count * band_count > max_data_size:
+        probe_image = resize(original_image, PROBE_SCALE)
+        probe_data_size = len(get_image_data(probe_image, format, quality))
+        encode_count += 1
+        data_size_per_pixel = probe_data_size / (probe_image.width * probe_image.height)
+        scale = sqrt(max_data_size / (data_size_per_pixel * pixel_count))
+        scale = min(1.0, scale * SCALE_MARGIN)
+        log.debug(f"Image probe data size {probe_data_size}, scale {scale:.3f}")
 
-    image_data = get_image_data(image)
+    image = original_image if scale == 1.0 else resize(original_image, scale)
+    image_data = get_image_data(image, format, quality)
+    encode_count += 1
     log.debug(f"Image data size {len(image_data)}")
 
-    step = 0.8
     while len(image_data) > max_data_size:
-        width = ceil(image.width * step)
-        height = ceil(image.height * step)
-        image = image.resize((width, height), Image.Resampling.HAMMING)
-        image_data = get_image_data(image)
-        log.debug(f"Image data size {len(image_data)}")
+        scale *= sqrt(max_data_size / len(image_data)) * SCALE_MARGIN
+        image = resize(original_image, scale)
+        image_data = get_image_data(image, format, quality)
+        encode_count += 1
+        log.debug(f"Image data size {len(image_data)} at {image.width}x{image.height}")
 
+    log.debug(f"Compressed image in {encode_count} encodes")
+    return CompressedImage(image, image_data, encode_count, format)
+
+
+def get_threshold(image: Image) -> int:
+    """
+    Get the gray level best separating the dark and light pixels of a grayscale
+    image, by Otsu's method.
+    """
+    histogram = image.histogram()
+    pixel_count = sum(histogram)
+    level_sum = sum(level * count for level, count in enumerate(histogram))
+
+    best_threshold, best_variance = 127, 0.0
+    dark_count, dark_sum = 0, 0
+    for level, count in enumerate(histogram):
+        dark_count += count
+        dark_sum += level * count
+        light_count = pixel_count - dark_count
+        if dark_count == 0 or light_count == 0:
+            continue
+        dark_mean = dark_sum / dark_count
+        light_mean = (level_sum - dark_sum) / light_count
+        variance = dark_count * light_count * (dark_mean - light_mean) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+
+def get_line_contrast(ink_mask: Image, angle: float) -> float:
+    """
+    Get how sharply the rows of an ink mask rotated by angle alternate between ink
+    and paper, which is highest when the lines of text are level.
+
+    Only the middle of the mask that any of DESKEW_ANGLES keeps filled is measured,
+    so the empty corners a rotation brings in do not count as lines.
+    """
+    rotated_mask = ink_mask.rotate(angle, Image.Resampling.BILINEAR)
+
+    largest_angle = radians(max(abs(angle) for angle in DESKEW_ANGLES))
+    margin_x = ceil(ink_mask.height / 2 * sin(largest_angle)) + 1
+    margin_y = ceil(ink_mask.width / 2 * sin(largest_angle)) + 1
+    if 2 * margin_x < ink_mask.width and 2 * margin_y < ink_mask.height:
+        rotated_mask = rotated_mask.crop(
+            (
+                margin_x,
+                margin_y,
+                ink_mask.width - margin_x,
+                ink_mask.height - margin_y,
+            )
+        )
+
+    rows = rotated_mask.resize((1, rotated_mask.height), Image.Resampling.BOX)
+    return ImageStat.Stat(rows).var[0]
+
+
+def get_skew_angle(image: Image) -> float:
+    """
+    Get the rotation in degrees that levels the lines of text of a small grayscale
+    image, of DESKEW_ANGLES.
+
+    Ties go to the smallest rotation, and 0 is kept unless another angle clearly
+    beats it, so an image without lines of text, such as a blank one, is not turned.
+    """
+    threshold = get_threshold(image)
+    ink_mask = image.point(lambda level: 255 if level <= threshold else 0)
+    contrasts = {angle: get_line_contrast(ink_mask, angle) for angle in DESKEW_ANGLES}
+
+    angle = max(DESKEW_ANGLES, key=lambda angle: (contrasts[angle], -abs(angle)))
+    if contrasts[angle] <= contrasts[0] * DESKEW_MIN_GAIN:
+        return 0.0
+    return angle
+
+
+def get_receipt_box(image: Image) -> tuple[int, int, int, int] | None:
+    """
+    Get the box of the light paper of the receipt in a small grayscale image, or None
+    if it cannot be told from the background.
+    """
+    threshold = get_threshold(image)
+    paper_mask = image.point(lambda level: 255 if level > threshold else 0)
+    # Remove specks of light background and fill the dark text on the paper
+    paper_mask = paper_mask.filter(ImageFilter.MinFilter(5)).filter(
+        ImageFilter.MaxFilter(5)
+    )
+    box = paper_mask.getbbox()
+    if box is None:
+        return None
+
+    left, top, right, bottom = box
+    if (right - left) * (bottom - top) < MIN_CROP_AREA * image.width * image.height:
+        return None
+    return box
+
+
+def get_receipt_side(image: Image) -> int:
+    """
+    Get the longest side in pixels of the receipt in a photo that is not loaded yet,
+    or of the whole photo if the receipt cannot be found.
+
+    A JPEG is decoded at PROBE_DRAFT_SCALE to find the receipt, so the photo has to be
+    opened again to be decoded for real.
+    """
+    width, height = image.size
+    image.draft(
+        "L", (ceil(width * PROBE_DRAFT_SCALE), ceil(height * PROBE_DRAFT_SCALE))
+    )
+    small_image = ImageOps.autocontrast(image.convert("L"), cutoff=1)
+    small_image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BOX)
+
+    box = get_receipt_box(small_image)
+    if box is None:
+        return max(width, height)
+
+    left, top, right, bottom = box
+    return ceil(max(right - left, bottom - top) * width / small_image.width)
+
+
+def get_draft_size(
+    image: Image, max_side: int, receipt_side: int | None = None
+) -> tuple[int, int]:
+    """
+    Get the size to decode an image at for the longest side of the receipt cropped
+    from it to be at least DRAFT_TOLERANCE of max_side.
+
+    Without the receipt_side from get_receipt_side, the smallest crop is assumed: it
+    covers MIN_CROP_AREA of the image, and the longest side of a box is at least the
+    square root of its area.
+    """
+    if receipt_side is None:
+        receipt_side = sqrt(MIN_CROP_AREA * image.width * image.height)
+    scale = min(1.0, max_side * DRAFT_TOLERANCE / receipt_side)
+    return ceil(image.width * scale), ceil(image.height * scale)
+
+
+def preprocess(
+    image: Image, max_side: int = IMAGE_MAX_SIDE, receipt_side: int | None = None
+) -> Image:
+    """
+    Prepare a photo of a receipt for the model.
+
+    A JPEG that is not loaded yet is decoded straight to grayscale at the smallest
+    scale that keeps about max_side for the receipt, so the full size color bitmap of
+    a large photo is never held in memory. Then applies the EXIF orientation,
+    stretches the contrast, crops to the paper of the receipt, straightens small
+    rotations of its text and caps the longest side at max_side. The crop and
+    rotation are found on small copies.
+
+    Parameters
+    ----------
+    image : Image
+        The photo of the receipt.
+    max_side : int
+        The longest side to keep, in pixels.
+    receipt_side : int | None
+        The longest side of the receipt in the photo from get_receipt_side. Without
+        it the JPEG is decoded for the smallest receipt it may be cropped to.
+
+    Returns
+    -------
+    Image
+        The grayscale receipt.
+    """
+    image.draft("L", get_draft_size(image, max_side, receipt_side))
+    image = ImageOps.exif_transpose(image).convert("L")
+    image = ImageOps.autocontrast(image, cutoff=1)
+
+    small_image = image.copy()
+    small_image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BOX)
+
+    box = get_receipt_box(small_image)
+    if box:
+        scale = image.width / small_image.width
+        left, top, right, bottom = box
+        margin = CROP_MARGIN * max(right - left, bottom - top)
+        image = image.crop(
+            (
+                max(0, floor((left - margin) * scale)),
+                max(0, floor((top - margin) * scale)),
+                min(image.width, ceil((right + margin) * scale)),
+                min(image.height, ceil((bottom + margin) * scale)),
+            )
+        )
+        small_image = image.copy()
+        small_image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BOX)
+        log.debug(f"Cropped receipt to {image.width}x{image.height}")
+
+    angle = get_skew_angle(small_image)
+    if angle:
+        image = image.rotate(
+            angle, Image.Resampling.BICUBIC, expand=True, fillcolor=255
+        )
+        log.debug(f"Straightened receipt by {angle} degrees")
+
+    image.thumbnail((max_side, max_side), Image.Resampling.HAMMING)
     return image
 
 
 def load_image(image_file_path: os.PathLike) -> bytes:
-    return get_image_data(compress(Image.open(image_file_path), 1024 * 1024 * 5))
+    """
+    Encode an uploaded image in the smallest format that keeps IMAGE_MIN_PSNR, at the
+    largest size that fits in MAX_IMAGE_DATA_SIZE.
+
+    Receipts are first cropped, straightened, turned grayscale and capped at
+    IMAGE_MAX_SIDE, unless IMAGE_PREPROCESS is 0. A JPEG is opened twice for that,
+    to find the receipt at a small scale and then decode it at the scale the receipt
+    needs. The data starts with the signature of its format, which get_mime_type
+    reads back.
+    """
+    image = Image.open(image_file_path)
+    if IMAGE_PREPROCESS:
+        receipt_side = None
+        if image.format == "JPEG":
+            receipt_side = get_receipt_side(image)
+            image = Image.open(image_file_path)
+        image = preprocess(image, receipt_side=receipt_side)
+    else:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    choice_image = image.copy()
+    choice_image.thumbnail((CHOICE_SIZE, CHOICE_SIZE), Image.Resampling.HAMMING)
+    format, quality = choose_encoding(choice_image)
+
+    return compress(image, MAX_IMAGE_DATA_SIZE, format, quality).data
+
+
+def load_image_data(image_data: bytes) -> bytes:
+    """
+    Encode uploaded image data like load_image, for callers in another process.
+    """
+    return load_image(io.BytesIO(image_data))
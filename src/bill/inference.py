@@ -0,0 +1,298 @@
+from abc import ABC, abstractmethod
+from bill.clients import get_async_client, get_client
+from bill.metrics import InferenceCall
+from pydantic import BaseModel
+from pathlib import Path
+from logging import getLogger
+from threading import Lock
+from typing import Any, Iterator
+import asyncio
+import json
+import os
+import time
+
+log = getLogger(__file__)
+
+INFERENCE_BACKEND = "INFERENCE_BACKEND"
+INFERENCE_REPLAY_FILE = "INFERENCE_REPLAY_FILE"
+INFERENCE_REPLAY_LATENCY = "INFERENCE_REPLAY_LATENCY"
+
+
+class InferenceBackend(ABC):
+    """
+    Answers questions about receipt images with structured output.
+
+    Messages are in the OpenAI chat format and response_format is the Pydantic model
+    the answer is parsed into. Backends that know the token usage of a call add it to
+    the call, if one is given.
+    """
+
+    @abstractmethod
+    def parse(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ): ...
+
+    @abstractmethod
+    async def parse_async(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ): ...
+
+    @abstractmethod
+    def stream(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ) -> Iterator[dict | BaseModel]:
+        """
+        Yield the answer parsed so far as a dict each time more of it arrives, then
+        the parsed answer.
+
+        The last entry of a list in a partial answer may still be incomplete.
+        """
+
+
+class OpenAIBackend(InferenceBackend):
+    """
+    Asks the OpenAI API, or any OpenAI-compatible server set in INFERENCE_BASE_URL.
+    """
+
+    def __init__(self, client: Any = None, async_client: Any = None):
+        """
+        Parameters
+        ----------
+        client : OpenAI | None
+            Client to use instead of the process-wide client of bill.clients.
+        async_client : AsyncOpenAI | None
+            Async client to use instead of the event loop's client of bill.clients.
+        """
+        self.client = client
+        self.async_client = async_client
+
+    def parse(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ):
+        client = self.client or get_client()
+        response = client.beta.chat.completions.parse(
+            model=model, messages=messages, response_format=response_format
+        )
+        if call:
+            call.set_usage(response.usage)
+        return response.choices[0].message.parsed
+
+    async def parse_async(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ):
+        async_client = self.async_client or get_async_client()
+        response = await async_client.beta.chat.completions.parse(
+            model=model, messages=messages, response_format=response_format
+        )
+        if call:
+            call.set_usage(response.usage)
+        return response.choices[0].message.parsed
+
+    def stream(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ) -> Iterator[dict | BaseModel]:
+        client = self.client or get_client()
+        with client.beta.chat.completions.stream(
+            model=model,
+            messages=messages,
+            response_format=response_format,
+            stream_options={"include_usage": True},
+        ) as stream:
+            for event in stream:
+                if event.type == "content.delta" and isinstance(event.parsed, dict):
+                    yield event.parsed
+            response = stream.get_final_completion()
+        if call:
+            call.set_usage(response.usage)
+        yield response.choices[0].message.parsed
+
+
+# Words of a question about a single amount and the field of the recording it asks for
+REPLAY_QUESTIONS = (
+    ("subtotal", "Subtotal", "subtotal"),
+    ("service charge", "Service charge", "service_charge"),
+    ("tax", "Tax", "tax"),
+)
+
+
+class ReplayBackend(InferenceBackend):
+    """
+    Answers every receipt from one recorded extraction, without any network access.
+
+    The recording is ReceiptData JSON, such as an entry of the extraction cache. Each
+    answer is delayed by latency seconds to stand in for the model, so the whole
+    upload to payments flow can be load tested and profiled offline.
+    """
+
+    def __init__(self, recording: dict, latency: float = 0.0):
+        """
+        Parameters
+        ----------
+        recording : dict
+            Recorded extraction with items, subtotal, service_charge and tax.
+        latency : float
+            Seconds each answer takes. A streamed answer is spread over that time.
+        """
+        self.recording = recording
+        self.latency = latency
+
+    @classmethod
+    def from_file(cls, path: os.PathLike, latency: float = 0.0) -> "ReplayBackend":
+        return cls(json.loads(Path(path).read_text()), latency)
+
+    def answer(self, messages: list, response_format: type[BaseModel]) -> BaseModel:
+        fields = response_format.model_fields
+        if "items" in fields:
+            return response_format.model_validate(
+                {name: self.recording[name] for name in fields}
+            )
+
+        question = get_question(messages).lower()
+        for words, name, field in REPLAY_QUESTIONS:
+            if words in question:
+                return response_format.model_validate(
+                    {"name": name, "price": self.recording[field]}
+                )
+        raise ValueError(f"No recorded answer to: {question}")
+
+    def parse(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ):
+        time.sleep(self.latency)
+        return self.answer(messages, response_format)
+
+    async def parse_async(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ):
+        await asyncio.sleep(self.latency)
+        return self.answer(messages, response_format)
+
+    def stream(
+        self,
+        model: str,
+        messages: list,
+        response_format: type[BaseModel],
+        call: InferenceCall | None = None,
+    ) -> Iterator[dict | BaseModel]:
+        answer = self.answer(messages, response_format)
+        items = [item.model_dump() for item in getattr(answer, "items", [])]
+        delay = self.latency / (len(items) + 1)
+
+        for item_count in range(len(items)):
+            time.sleep(delay)
+            yield {"items": items[:item_count] + [{}]}
+        time.sleep(delay)
+        yield answer
+
+
+def get_question(messages: list) -> str:
+    """
+    Get the text of the last user message.
+    """
+    content = messages[-1]["content"]
+    if isinstance(content, str):
+        return content
+    return " ".join(part["text"] for part in content if part["type"] == "text")
+
+
+def create_openai_backend() -> InferenceBackend:
+    return OpenAIBackend()
+
+
+def create_replay_backend() -> InferenceBackend:
+    return ReplayBackend.from_file(
+        os.environ[INFERENCE_REPLAY_FILE],
+        float(os.environ.get(INFERENCE_REPLAY_LATENCY, "0")),
+    )
+
+
+INFERENCE_BACKENDS = {
+    "openai": create_openai_backend,
+    "replay": create_replay_backend,
+}
+
+_backend: InferenceBackend | None = None
+_lock = Lock()
+
+
+def create_backend(name: str) -> InferenceBackend:
+    """
+    Create an inference backend by name.
+
+    Parameters
+    ----------
+    name : str
+        "openai" to ask the OpenAI API or a compatible server, "replay" to answer
+        from the recording in INFERENCE_REPLAY_FILE after INFERENCE_REPLAY_LATENCY
+        seconds.
+
+    Returns
+    -------
+    InferenceBackend
+        The backend.
+    """
+    try:
+        create = INFERENCE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown inference backend {name!r}, expected one of {list(INFERENCE_BACKENDS)}"
+        ) from None
+    return create()
+
+
+def get_backend() -> InferenceBackend:
+    """
+    Get the process-wide inference backend named in INFERENCE_BACKEND, by default
+    "openai".
+    """
+    global _backend
+
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = create_backend(os.environ.get(INFERENCE_BACKEND, "openai"))
+                log.info(f"Using {type(_backend).__name__} for inference")
+    return _backend
+
+
+def set_backend(backend: InferenceBackend | None):
+    """
+    Replace the process-wide inference backend, or reset it to INFERENCE_BACKEND with
+    None.
+    """
+    global _backend
+
+    with _lock:
+        _backend = backend
@@ -0,0 +1,125 @@
+import heapq
+from collections import defaultdict
+from bill.calculator import Calculator
+from bill.person import Person
+from bill.receipts import Items
+from pydantic import BaseModel
+
+
+class LedgerReceipt(BaseModel):
+    """
+    One receipt of a ledger, paid in full by payer and split among persons.
+    """
+
+    payer: str
+    persons: list[Person]
+    items: Items
+    extras: Items
+
+
+class Transfer(BaseModel):
+    """
+    A payment from debtor to creditor that settles part of a ledger.
+    """
+
+    debtor: str
+    creditor: str
+    amount: float
+
+
+class Ledger:
+    """
+    An account combining many receipts, e.g. every bill of a trip.
+
+    Persons are identified across receipts by name. Each receipt is split with the
+    integer-cents settlement, so balances are exact and always net to zero.
+    """
+
+    def __init__(self, receipts: list[LedgerReceipt] | None = None):
+        """
+        Initialize the ledger with receipts.
+
+        Parameters
+        ----------
+        receipts: list[LedgerReceipt] | None
+            Receipts to start the ledger with
+        """
+        self.receipts: list[LedgerReceipt] = []
+        self.balances: dict[str, int] = defaultdict(int)
+        for receipt in receipts or []:
+            self.add_receipt(receipt)
+
+    def add_receipt(self, receipt: LedgerReceipt) -> None:
+        """
+        Add a receipt and update everyone's balance.
+
+        Every person owes their total of the receipt and the payer is owed the sum
+        of those totals. Items nobody shares are left out on both sides.
+
+        Parameters
+        ----------
+        receipt: LedgerReceipt
+            The receipt to add
+        """
+        calculator = Calculator(
+            persons=receipt.persons,
+            items=receipt.items,
+            extras=receipt.extras,
+            backend="cents",
+        )
+        settlement = calculator.settlement
+
+        for person, total_cents in zip(receipt.persons, settlement.total_cents):
+            self.balances[person.name] -= total_cents
+        self.balances[receipt.payer] += sum(settlement.total_cents)
+
+        self.receipts.append(receipt)
+
+    def get_balances(self) -> dict[str, float]:
+        """
+        Get everyone's net balance.
+
+        Returns
+        -------
+        dict[str, float]
+            Positive balances are owed to the person, negative ones are owed by them
+        """
+        return {name: cents / 100 for name, cents in self.balances.items()}
+
+    def settle(self) -> list[Transfer]:
+        """
+        Get transfers that settle every balance.
+
+        The largest debtor repeatedly pays the largest creditor as much as either of
+        them can, using a heap for each side. Every transfer clears at least one
+        balance, so there are fewer transfers than persons with a balance, in
+        O(n log n).
+
+        Returns
+        -------
+        list[Transfer]
+            The transfers, in the order they were matched
+        """
+        creditors = [
+            (-cents, name) for name, cents in self.balances.items() if cents > 0
+        ]
+        debtors = [(cents, name) for name, cents in self.balances.items() if cents < 0]
+        heapq.heapify(creditors)
+        heapq.heapify(debtors)
+
+        transfers = []
+        while creditors and debtors:
+            credit, creditor = heapq.heappop(creditors)
+            debt, debtor = heapq.heappop(debtors)
+            amount = min(-credit, -debt)
+
+            transfers.append(
+                Transfer(debtor=debtor, creditor=creditor, amount=amount / 100)
+            )
+
+            if -credit > amount:
+                heapq.heappush(creditors, (credit + amount, creditor))
+            if -debt > amount:
+                heapq.heappush(debtors, (debt + amount, debtor))
+
+        return transfers
@@ -0,0 +1,270 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from logging import getLogger
+from threading import Lock
+from typing import Any, Callable, Iterator
+import json
+import time
+
+log = getLogger(__file__)
+
+INF = float("inf")
+
+# Upper bounds of the histogram buckets of each measurement of an inference call
+BUCKETS = {
+    "wall_time_seconds": (0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, INF),
+    "prompt_tokens": (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, INF),
+    "completion_tokens": (50, 100, 250, 500, 1000, 2000, 4000, 8000, INF),
+    "cached_tokens": (0, 250, 500, 1000, 2000, 4000, 8000, 16000, INF),
+    "payload_bytes": (
+        64 * 1024,
+        256 * 1024,
+        1024 * 1024,
+        2 * 1024 * 1024,
+        4 * 1024 * 1024,
+        8 * 1024 * 1024,
+        INF,
+    ),
+}
+
+
+class Histogram:
+    """
+    Counts of observed values per bucket, with their sum, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_counts(self) -> list[int]:
+        cumulative_counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative_counts.append(total)
+        return cumulative_counts
+
+
+class InferenceCall:
+    """
+    Measurements of one inference call. Backends fill in the token counts.
+    """
+
+    def __init__(self, question: str, payload_bytes: int):
+        """
+        Parameters
+        ----------
+        question : str
+            What the call asks, such as "extraction" or "tax".
+        payload_bytes : int
+            Size of the images sent with the call.
+        """
+        self.question = question
+        self.payload_bytes = payload_bytes
+        self.wall_time_seconds = 0.0
+        self.prompt_tokens: int | None = None
+        self.completion_tokens: int | None = None
+        self.cached_tokens: int | None = None
+        self.failed = False
+
+    def set_usage(self, usage: Any):
+        """
+        Take the token counts of the usage of an OpenAI completion, if reported.
+        """
+        if usage is None:
+            return
+        self.prompt_tokens = usage.prompt_tokens
+        self.completion_tokens = usage.completion_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+    def get_measurements(self) -> dict[str, float]:
+        measurements = {
+            "wall_time_seconds": self.wall_time_seconds,
+            "payload_bytes": self.payload_bytes,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_tokens": self.cached_tokens,
+        }
+        return {
+            name: value for name, value in measurements.items() if value is not None
+        }
+
+
+class InferenceMetrics:
+    """
+    Histograms of the measurements of inference calls, per question.
+    """
+
+    def __init__(self):
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.failures: dict[str, int] = {}
+        self.lock = Lock()
+
+    @contextmanager
+    def measure(self, question: str, payload_bytes: int) -> Iterator[InferenceCall]:
+        """
+        Time an inference call and record it once done, even if it fails.
+
+        Parameters
+        ----------
+        question : str
+            What the call asks, such as "extraction" or "tax".
+        payload_bytes : int
+            Size of the images sent with the call.
+
+        Yields
+        ------
+        InferenceCall
+            The call, for the backend to add its token counts to.
+        """
+        call = InferenceCall(question, payload_bytes)
+        start = time.perf_counter()
+        try:
+            yield call
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            call.wall_time_seconds = time.perf_counter() - start
+            self.record(call)
+
+    def measure_stream(
+        self,
+        question: str,
+        payload_bytes: int,
+        open_stream: Callable[[InferenceCall], Iterator],
+    ) -> Iterator:
+        """
+        Pass on a streamed inference call and record it once done, even if it fails.
+
+        Only the time spent waiting for the stream counts, not the time the consumer
+        takes between entries. A consumer that stops early, such as a client that
+        disconnected, closes the stream without counting as a failure.
+
+        Parameters
+        ----------
+        question : str
+            What the call asks, such as "extraction" or "tax".
+        payload_bytes : int
+            Size of the images sent with the call.
+        open_stream : Callable[[InferenceCall], Iterator]
+            Starts the call, given the call for the backend to add its token counts
+            to.
+
+        Yields
+        ------
+        Any
+            The entries of the stream.
+        """
+        call = InferenceCall(question, payload_bytes)
+        stream = None
+        try:
+            start = time.perf_counter()
+            try:
+                stream = open_stream(call)
+            finally:
+                call.wall_time_seconds += time.perf_counter() - start
+
+            while True:
+                start = time.perf_counter()
+                try:
+                    entry = next(stream)
+                except StopIteration:
+                    break
+                finally:
+                    call.wall_time_seconds += time.perf_counter() - start
+                yield entry
+        except GeneratorExit:
+            raise
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+            self.record(call)
+
+    def record(self, call: InferenceCall):
+        measurements = call.get_measurements()
+        with self.lock:
+            for name, value in measurements.items():
+                key = (name, call.question)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(BUCKETS[name])
+                histogram.observe(value)
+            if call.failed:
+                self.failures[call.question] = self.failures.get(call.question, 0) + 1
+
+        log.info(
+            json.dumps(
+                {
+                    "event": "inference_call",
+                    "question": call.question,
+                    "failed": call.failed,
+                    **measurements,
+                }
+            )
+        )
+
+    def render(self) -> str:
+        """
+        Get the histograms in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name in BUCKETS:
+                metric = f"inference_{name}"
+                histograms = sorted(
+                    (
+                        (question, histogram)
+                        for (
+                            histogram_name,
+                            question,
+                        ), histogram in self.histograms.items()
+                        if histogram_name == name
+                    ),
+                    key=lambda entry: entry[0],
+                )
+                if not histograms:
+                    continue
+
+                lines.append(f"# TYPE {metric} histogram")
+                for question, histogram in histograms:
+                    labels = f'question="{question}"'
+                    for bucket, count in zip(
+                        histogram.buckets, histogram.get_cumulative_counts()
+                    ):
+                        bound = "+Inf" if bucket == INF else str(bucket)
+                        lines.append(
+                            f'{metric}_bucket{{{labels},le="{bound}"}} {count}'
+                        )
+                    lines.append(f"{metric}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+
+            if self.failures:
+                lines.append("# TYPE inference_failures_total counter")
+                for question, count in sorted(self.failures.items()):
+                    lines.append(
+                        f'inference_failures_total{{question="{question}"}} {count}'
+                    )
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.failures.clear()
+
+
+# Process-wide metrics of every inference call
+inference_metrics = InferenceMetrics()
@@ -0,0 +1,59 @@
+from array import array
+from typing import Sequence
+
+
+def to_cents(price: float) -> int:
+    """
+    Convert a price in currency units to integer cents.
+
+    Parameters
+    ----------
+    price: float
+        The price, e.g. 12.34
+
+    Returns
+    -------
+    int
+        The price in cents, e.g. 1234
+    """
+    return round(price * 100)
+
+
+def allocate(amount: int, weights: Sequence[int]) -> array:
+    """
+    Allocate an amount of cents proportionally to weights with the largest-remainder method.
+
+    Every weight first gets the floor of its exact quota. The cents left over are then
+    given one at a time to the weights with the largest remainders, earlier weights
+    winning ties, so the allocation always adds up to exactly the amount.
+
+    Parameters
+    ----------
+    amount: int
+        The amount to allocate, in cents
+    weights: Sequence[int]
+        Non-negative weights, e.g. person subtotals in cents
+
+    Returns
+    -------
+    array
+        Array of cents (typecode "q") aligned to weights. Split evenly if the weights
+        sum to 0, so the amount is never dropped.
+    """
+    if not weights:
+        return array("q")
+
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        return allocate(amount, [1] * len(weights))
+
+    shares = array("q", [amount * weight // total_weight for weight in weights])
+    remainders = [amount * weight % total_weight for weight in weights]
+
+    leftover = amount - sum(shares)
+    if leftover:
+        ranked = sorted(range(len(weights)), key=remainders.__getitem__, reverse=True)
+        for i in ranked[:leftover]:
+            shares[i] += 1
+
+    return shares
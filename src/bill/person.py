@@ -1,63 +1,166 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, ConfigDict, GetCoreSchemaHandler
+from pydantic_core import core_schema
+from typing import Any, Iterable, Iterator
+
+# Most items a set can hold, so that a bad index cannot allocate a huge int
+MAX_ITEMS = 1 << 16
+
+
+class ItemSet:
+    """
+    A set of item indexes stored as the bits of an int.
+
+    Membership and toggling are single bit operations, and union or intersection of
+    two sets is one int operation. Iterates in ascending order and serializes to the
+    sorted list of indexes, e.g. [0, 2, 5].
+    """
+
+    __slots__ = ("mask",)
+
+    def __init__(self, item_indexes: Iterable[int] = ()):
+        mask = 0
+        for item_index in item_indexes:
+            mask |= self.bit(item_index)
+        self.mask = mask
+
+    @staticmethod
+    def bit(item_index: int) -> int:
+        if item_index < 0:
+            raise ValueError(f"Item index must not be negative: {item_index}")
+        if item_index >= MAX_ITEMS:
+            raise ValueError(f"Item index out of range: {item_index}")
+        return 1 << item_index
+
+    @classmethod
+    def from_mask(cls, mask: int) -> "ItemSet":
+        item_set = cls()
+        item_set.mask = mask
+        return item_set
+
+    @classmethod
+    def union(cls, *item_sets: "ItemSet") -> "ItemSet":
+        mask = 0
+        for item_set in item_sets:
+            mask |= item_set.mask
+        return cls.from_mask(mask)
+
+    def add(self, item_index: int) -> None:
+        self.mask |= self.bit(item_index)
+
+    def discard(self, item_index: int) -> None:
+        self.mask &= ~self.bit(item_index)
+
+    def toggle(self, item_index: int) -> None:
+        self.mask ^= self.bit(item_index)
+
+    def __contains__(self, item_index: object) -> bool:
+        if not isinstance(item_index, int) or item_index < 0:
+            return False
+        return bool(self.mask >> item_index & 1)
+
+    def __iter__(self) -> Iterator[int]:
+        mask = self.mask
+        while mask:
+            lowest_bit = mask & -mask
+            yield lowest_bit.bit_length() - 1
+            mask ^= lowest_bit
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def __or__(self, other: "ItemSet") -> "ItemSet":
+        return ItemSet.from_mask(self.mask | other.mask)
+
+    def __and__(self, other: "ItemSet") -> "ItemSet":
+        return ItemSet.from_mask(self.mask & other.mask)
+
+    def __sub__(self, other: "ItemSet") -> "ItemSet":
+        return ItemSet.from_mask(self.mask & ~other.mask)
+
+    def __ior__(self, other: "ItemSet") -> "ItemSet":
+        self.mask |= other.mask
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ItemSet):
+            return self.mask == other.mask
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ItemSet({list(self)})"
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        from_list = core_schema.no_info_after_validator_function(
+            cls, core_schema.list_schema(core_schema.int_schema(ge=0, lt=MAX_ITEMS))
+        )
+        return core_schema.json_or_python_schema(
+            json_schema=from_list,
+            python_schema=core_schema.union_schema(
+                [core_schema.is_instance_schema(cls), from_list]
+            ),
+            serialization=core_schema.plain_serializer_function_ser_schema(list),
+        )
 
 
 class Person(BaseModel):
+    model_config = ConfigDict(validate_assignment=True)
+
     name: str
-    items: List[int]
+    items: ItemSet
 
     def insert_item(self, item_index: int) -> None:
         """
-        Add an item to the person's items list if not already present.
+        Add an item to the person's items if not already present.
 
         Parameters
         ----------
         item_index : int
-            The index of the item to add to the person's items list.
+            The index of the item to add to the person's items.
 
         Returns
         -------
         None
-            The items list is modified in place.
+            The items set is modified in place.
         """
-        items_set = set(self.items)
-        items_set.add(item_index)
-        self.items = sorted(list(items_set))
+        self.items.add(item_index)
 
     def remove_item(self, item_index: int) -> None:
         """
-        Remove an item from the person's items list if present.
+        Remove an item from the person's items if present.
 
         Parameters
         ----------
         item_index : int
-            The index of the item to remove from the person's items list.
+            The index of the item to remove from the person's items.
 
         Returns
         -------
         None
-            The items list is modified in place.
+            The items set is modified in place.
         """
-        try:
-            self.items.remove(item_index)
-        except ValueError:
-            pass
+        self.items.discard(item_index)
 
     def update_item(self, item_index: int) -> None:
         """
-        Toggle an item in the person's items list - add if not present, remove if present.
+        Toggle an item in the person's items - add if not present, remove if present.
 
         Parameters
         ----------
         item_index : int
-            The index of the item to toggle in the person's items list.
+            The index of the item to toggle in the person's items.
 
         Returns
         -------
         None
-            The items list is modified in place.
+            The items set is modified in place.
         """
-        if item_index not in self.items:
-            self.insert_item(item_index)
-        else:
-            self.remove_item(item_index)
+        self.items.toggle(item_index)
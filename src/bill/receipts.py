@@ -1,24 +1,68 @@
-import os
+import asyncio
 import base64
-from openai import OpenAI
-from pydantic import BaseModel
+import hashlib
+import secrets
+from bill.cache import ExtractionCache
+from bill.images import get_mime_type
+from bill.inference import InferenceBackend, get_backend
+from bill.metrics import inference_metrics
+from pydantic import (
+    BaseModel,
+    PrivateAttr,
+    ValidationError,
+    model_serializer,
+    model_validator,
+)
 from logging import getLogger
+from functools import cached_property
+from typing import Any, Iterator
+import os
 
 log = getLogger(__file__)
 
-INFERENCE_API_TOKEN = os.environ["INFERENCE_API_TOKEN"]
-INFERENCE_MODEL = "o4-mini"
+INFERENCE_MODEL = os.environ.get("INFERENCE_MODEL", "o4-mini")
+
+
+def new_item_id() -> int:
+    """
+    Get a random item id, so new items do not collide with ids saved by other
+    processes.
+    """
+    return secrets.randbits(63)
 
 
 class Item(BaseModel):
     name: str
     price: float
 
+    # Assigned when the item is created or copied, and saved by Items; not part of
+    # the JSON or schema of the item, which the model answers in.
+    _id: int = PrivateAttr(default_factory=new_item_id)
+
+    @property
+    def id(self) -> int:
+        return self._id
+
+    def __copy__(self):
+        item = super().__copy__()
+        item._id = new_item_id()
+        return item
+
+    def __deepcopy__(self, memo: dict | None = None):
+        item = super().__deepcopy__(memo)
+        item._id = new_item_id()
+        return item
+
     def __str__(self):
         return f"{self.name} : {self.price}"
 
+    def __eq__(self, other):
+        if not isinstance(other, Item):
+            return NotImplemented
+        return self.name == other.name and self.price == other.price
+
     def __hash__(self):
-        return str(self).lower().__hash__()
+        return hash((self.name.lower(), self.price))
 
     def split(self):
         split_price = round(self.price / 2, 2)
@@ -33,6 +77,32 @@ class Item(BaseModel):
 class Items(BaseModel):
     items: list[Item]
 
+    # Item id to position in items, and to the item indexed under it
+    _positions: dict[int, int] = PrivateAttr(default_factory=dict)
+    _indexed_items: dict[int, Item] = PrivateAttr(default_factory=dict)
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def restore_ids(cls, data: Any, handler) -> "Items":
+        """
+        Give the items the ids saved with them, if any.
+        """
+        items = handler(data)
+        ids = data.get("ids") if isinstance(data, dict) else None
+        if ids and len(ids) == len(items.items):
+            for item, item_id in zip(items.items, ids):
+                item._id = item_id
+        return items
+
+    @model_serializer(mode="wrap")
+    def dump_ids(self, handler) -> dict:
+        """
+        Save the ids of the items with them, so they stay the same once loaded.
+        """
+        data = handler(self)
+        data["ids"] = [item.id for item in self.items]
+        return data
+
     def __str__(self):
         items = map(str, self.items)
         return "\n".join(items)
@@ -41,105 +111,470 @@ class Items(BaseModel):
         prices = map(lambda item: item.price, self.items)
         return sum(prices)
 
+    def reindex(self):
+        """
+        Rebuild the id to position index.
+
+        An item that shares its id with another keeps it if it was indexed under that
+        id before, and is otherwise given a new one, so an id never moves to a copy.
+        """
+        owners = {}
+        for item in self.items:
+            if item.id not in owners or item is self._indexed_items.get(item.id):
+                owners[item.id] = item
+
+        self._positions = {}
+        self._indexed_items = {}
+        for position, item in enumerate(self.items):
+            if owners[item.id] is not item:
+                item._id = new_item_id()
+            self._positions[item.id] = position
+            self._indexed_items[item.id] = item
+
+    def index_of(self, item: Item) -> int:
+        """
+        Get the position of an item by its id.
+
+        The index is rebuilt if items were changed without going through this class,
+        and falls back to a search by value for an item that is not in the list.
+
+        Parameters
+        ----------
+        item : Item
+            The item to look up.
+
+        Returns
+        -------
+        int
+            The position of the item in items.
+        """
+        position = self._positions.get(item.id)
+        if (
+            position is None
+            or position >= len(self.items)
+            or self.items[position] is not item
+        ):
+            self.reindex()
+            position = self._positions.get(item.id)
+
+        if position is None or self.items[position] is not item:
+            return self.items.index(item)
+        return position
+
+    def append(self, item: Item):
+        """
+        Add an item to the end of items and index it.
+
+        Parameters
+        ----------
+        item : Item
+            The item to add.
+        """
+        if self._indexed_items.get(item.id, item) is not item:
+            item._id = new_item_id()
+        self.items.append(item)
+        self._positions[item.id] = len(self.items) - 1
+        self._indexed_items[item.id] = item
+
     def split(self, item: int):
         split_items = self.items[item].split()
         self.items[item] = split_items[0]
         self.items.insert(item + 1, split_items[1])
+        self.reindex()
+
+
+class ReceiptData(BaseModel):
+    items: list[Item]
+    subtotal: float
+    service_charge: float
+    tax: float
+
+    def get_items(self) -> Items:
+        return Items(items=self.items)
+
+    def get_extras(self) -> Items:
+        return Items(
+            items=[
+                Item(name="Service charge", price=self.service_charge),
+                Item(name="Tax", price=self.tax),
+            ]
+        )
+
+
+SYSTEM_PROMPT = "You are an assistant that analyzes restaurant receipts. You can see the receipt image and will answer questions about it."
+
+# Bump whenever the prompts or ReceiptData change, so cached extractions are redone.
+PROMPT_VERSION = "1"
+
+EXTRACTION_PROMPT = (
+    "Read this receipt image and extract:\n"
+    "- items: the individual items and their prices, one entry per line on the receipt\n"
+    "- subtotal: the subtotal amount before service charge and tax\n"
+    "- service_charge: the service charge, tip, or gratuity amount, or 0 if none is found\n"
+    "- tax: the tax amount, or 0 if none is found"
+)
+
+ITEMS_QUESTION = "What are the individual items and their prices? Give me the list of item names and their prices."
+SUBTOTAL_QUESTION = "What is the subtotal amount?"
+SERVICE_CHARGE_QUESTION = (
+    "What is the service charge, tip, or gratuity amount? If none is found, return 0."
+)
+TAX_QUESTION = "What is the tax amount?"
+
+# Chat messages refer to the receipt image by a URL with this scheme and the hash of
+# the image data, and the image is only attached when the messages are sent.
+IMAGE_REFERENCE_SCHEME = "receipt-image:"
+
+
+def get_image_reference(image_data: bytes) -> str:
+    return f"{IMAGE_REFERENCE_SCHEME}{hashlib.sha256(image_data).hexdigest()}"
+
+
+def get_image_parts(messages: list) -> Iterator[dict]:
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    yield part
+
+
+def get_payload_bytes(messages: list) -> int:
+    """
+    Get the size of the images attached to messages.
+    """
+    return sum(
+        len(part["image_url"]["url"])
+        for part in get_image_parts(messages)
+        if part["image_url"]["url"].startswith("data:")
+    )
 
 
 class Receipt:
-    def __init__(self, receipt_png_data: bytes):
+    def __init__(
+        self,
+        receipt_image_data: bytes,
+        cache: ExtractionCache | None = None,
+        backend: InferenceBackend | None = None,
+    ):
         """
         Initialize a Receipt instance with image data.
 
         Parameters
         ----------
-        receipt_png_data : bytes
-            Raw PNG image data of the receipt to be processed.
+        receipt_image_data : bytes
+            Encoded PNG, JPEG or WebP image data of the receipt to be processed.
+        cache : ExtractionCache | None
+            Cache of extraction results. Defaults to the cache in the
+            RECEIPT_CACHE_DIRECTORY environment variable, if set.
+        backend : InferenceBackend | None
+            Backend answering the questions. Defaults to the process-wide backend
+            of bill.inference.
 
         Notes
         -----
-        The image data is encoded to base64 and prepared for OpenAI API calls.
-        An OpenAI client is initialized using the INFERENCE_API_TOKEN environment variable.
+        Messages refer to the image by image_reference, and it is only encoded to
+        base64 and attached when they are sent to the backend.
         """
-        self.receipt_png_data = receipt_png_data
-        self.client = OpenAI(api_key=INFERENCE_API_TOKEN)
-        self.image = base64.b64encode(receipt_png_data).decode("utf-8")
-        self.image_url = f"data:image/png;base64,{self.image}"
-
-    def start_analysis(self) -> list:
+        self.receipt_image_data = receipt_image_data
+        self.backend = backend or get_backend()
+        self.image_reference = get_image_reference(receipt_image_data)
+        self.data: ReceiptData | None = None
+        self.cache = cache or ExtractionCache.from_environment()
+
+    @cached_property
+    def image_url(self) -> str:
+        image = base64.b64encode(self.receipt_image_data).decode("utf-8")
+        return f"data:{get_mime_type(self.receipt_image_data)};base64,{image}"
+
+    def get_image_messages(self, text: str) -> list:
         """
-        Start analysis of the receipt image and return conversation messages.
-
-        Returns
-        -------
-        list
-            List of messages for continued conversation with the AI.
+        Get the system message and a user message with text and a reference to the
+        receipt image.
         """
-        messages = [
-            {
-                "role": "system",
-                "content": "You are an assistant that analyzes restaurant receipts. You can see the receipt image and will answer questions about it.",
-            },
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {
                 "role": "user",
                 "content": [
-                    {
-                        "type": "text",
-                        "text": "Please read this receipt image. I'll ask you questions about it.",
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": self.image_url,
-                        },
-                    },
+                    {"type": "text", "text": text},
+                    {"type": "image_url", "image_url": {"url": self.image_reference}},
                 ],
             },
         ]
 
-        response = self.client.chat.completions.create(
-            model=INFERENCE_MODEL, messages=messages
-        )
+    def attach_image(self, messages: list) -> list:
+        """
+        Replace the references to the receipt image in messages with the image.
 
-        messages.append(
-            {"role": "assistant", "content": response.choices[0].message.content}
+        Parameters
+        ----------
+        messages : list
+            Chat messages, which are not changed.
+
+        Returns
+        -------
+        list
+            The messages as they are sent to the backend.
+        """
+        if not any(
+            part["image_url"]["url"] == self.image_reference
+            for part in get_image_parts(messages)
+        ):
+            return messages
+
+        image_part = {"type": "image_url", "image_url": {"url": self.image_url}}
+        attached = []
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, list):
+                content = [
+                    (
+                        image_part
+                        if part.get("type") == "image_url"
+                        and part["image_url"]["url"] == self.image_reference
+                        else part
+                    )
+                    for part in content
+                ]
+                message = {**message, "content": content}
+            attached.append(message)
+        return attached
+
+    def extract(self, use_cache: bool = True) -> ReceiptData:
+        """
+        Extract items, subtotal, service charge and tax in one inference call.
+
+        The result is kept on the receipt, so the per-field methods below reuse it
+        instead of asking the model again, and in the extraction cache if any, so the
+        same image uploaded again is not sent to the model.
+
+        Parameters
+        ----------
+        use_cache : bool
+            False to bypass the extraction cache and ask the model.
+
+        Returns
+        -------
+        ReceiptData
+            Everything read from the receipt.
+        """
+        if self.data is None and use_cache:
+            self.data = self.read_cache()
+
+        if self.data is None:
+            messages = self.get_image_messages(EXTRACTION_PROMPT)
+            self.data = self.run_inference(messages, ReceiptData)
+            log.debug(f"Extracted {len(self.data.items)} items from receipt")
+            self.write_cache()
+
+        return self.data
+
+    async def extract_concurrently(self, use_cache: bool = True) -> ReceiptData:
+        """
+        Extract items, subtotal, service charge and tax with concurrent inference calls.
+
+        Each question is sent on its own with the receipt image at the same time, so
+        the wall-clock time is that of the slowest question rather than their sum. The
+        result is kept and cached like that of extract.
+
+        Parameters
+        ----------
+        use_cache : bool
+            False to bypass the extraction cache and ask the model.
+
+        Returns
+        -------
+        ReceiptData
+            Everything read from the receipt.
+        """
+        if self.data is None and use_cache:
+            self.data = self.read_cache()
+
+        if self.data is None:
+            items, subtotal, service_charge, tax = await asyncio.gather(
+                self.run_inference_async(ITEMS_QUESTION, Items, "items"),
+                self.run_inference_async(SUBTOTAL_QUESTION, Item, "subtotal"),
+                self.run_inference_async(
+                    SERVICE_CHARGE_QUESTION, Item, "service_charge"
+                ),
+                self.run_inference_async(TAX_QUESTION, Item, "tax"),
+            )
+            self.data = ReceiptData(
+                items=items.items,
+                subtotal=subtotal.price,
+                service_charge=service_charge.price,
+                tax=tax.price,
+            )
+            log.debug(f"Extracted {len(self.data.items)} items from receipt")
+            self.write_cache()
+
+        return self.data
+
+    def stream_items(self, use_cache: bool = True) -> Iterator[Item]:
+        """
+        Extract the receipt like extract, yielding each item as soon as it is read.
+
+        The structured output is streamed and parsed as it arrives. An item is only
+        yielded once the model has moved on to the next one, or to the subtotal, so a
+        price cut off mid-number is never passed on. Once the stream ends the result
+        is kept and cached like that of extract.
+
+        Parameters
+        ----------
+        use_cache : bool
+            False to bypass the extraction cache and ask the model.
+
+        Yields
+        ------
+        Item
+            The items of the receipt, in order.
+        """
+        if self.data is None and use_cache:
+            self.data = self.read_cache()
+
+        if self.data is not None:
+            yield from self.data.items
+            return
+
+        item_count = 0
+        messages = self.attach_image(self.get_image_messages(EXTRACTION_PROMPT))
+        for parsed in inference_metrics.measure_stream(
+            "extraction",
+            get_payload_bytes(messages),
+            lambda call: self.backend.stream(
+                INFERENCE_MODEL, messages, ReceiptData, call
+            ),
+        ):
+            if isinstance(parsed, ReceiptData):
+                self.data = parsed
+                continue
+
+            partial_items = parsed.get("items") or []
+            complete_count = len(partial_items)
+            if "subtotal" not in parsed:
+                complete_count -= 1
+
+            while item_count < complete_count:
+                yield Item.model_validate(partial_items[item_count])
+                item_count += 1
+
+        yield from self.data.items[item_count:]
+        log.debug(f"Streamed {len(self.data.items)} items from receipt")
+        self.write_cache()
+
+    def get_cache_key(self) -> str:
+        return self.cache.get_key(
+            self.receipt_image_data, INFERENCE_MODEL, PROMPT_VERSION
         )
 
+    def read_cache(self) -> ReceiptData | None:
+        """
+        Get the cached extraction of this receipt, if any.
+        """
+        if not self.cache:
+            return None
+
+        key = self.get_cache_key()
+        cached_data = self.cache.get(key)
+        if cached_data is None:
+            return None
+
+        try:
+            return ReceiptData.model_validate_json(cached_data)
+        except ValidationError as e:
+            log.warning(f"Deleting invalid extraction cache entry {key}: {e}")
+            self.cache.delete(key)
+            return None
+
+    def write_cache(self):
+        if self.cache and self.data is not None:
+            self.cache.put(self.get_cache_key(), self.data.model_dump_json())
+
+    def start_analysis(self) -> list:
+        """
+        Start analysis of the receipt image and return conversation messages.
+
+        The messages hold a reference to the image rather than the image, followed by
+        the extracted facts, so they stay small when stored.
+
+        Returns
+        -------
+        list
+            List of messages for continued conversation with the AI.
+        """
+        data = self.extract()
+        messages = self.get_image_messages(
+            "Please read this receipt image. I'll ask you questions about it."
+        )
+        messages.append({"role": "assistant", "content": data.model_dump_json()})
         return messages
 
-    def run_inference(self, messages: list, response_format: BaseModel) -> BaseModel:
+    def run_inference(
+        self,
+        messages: list,
+        response_format: BaseModel,
+        question_type: str = "extraction",
+    ) -> BaseModel:
         """
-        Run inference on the provided messages using the OpenAI API and return the parsed response.
+        Run inference on the provided messages with the backend and return the parsed response.
+
+        The call is timed and recorded in bill.metrics.inference_metrics.
 
         Parameters
         ----------
         messages : list
-            The conversation history to send to the model.
+            The conversation history to send to the model, with the receipt image
+            attached in place of its references.
         response_format : BaseModel
             The Pydantic model to use for structured output.
+        question_type : str
+            What the messages ask, to group the metrics of the call by.
 
         Returns
         -------
         BaseModel
             The parsed response from the model as an instance of the provided response_format.
         """
-        response = self.client.beta.chat.completions.parse(
-            model=INFERENCE_MODEL,
-            messages=messages,
-            response_format=response_format,
-        )
-        return response.choices[0].message.parsed
-        response = self.client.beta.chat.completions.parse(
-            model=INFERENCE_MODEL,
-            messages=messages,
-            response_format=response_format,
-        )
-        return response.choices[0].message.parsed
+        messages = self.attach_image(messages)
+        with inference_metrics.measure(
+            question_type, get_payload_bytes(messages)
+        ) as call:
+            return self.backend.parse(INFERENCE_MODEL, messages, response_format, call)
+
+    async def run_inference_async(
+        self, question: str, response_format: BaseModel, question_type: str
+    ) -> BaseModel:
+        """
+        Ask a question about the receipt image without blocking and return the parsed response.
+
+        The call is timed and recorded in bill.metrics.inference_metrics.
+
+        Parameters
+        ----------
+        question : str
+            The question, sent along with the receipt image.
+        response_format : BaseModel
+            The Pydantic model to use for structured output.
+        question_type : str
+            What the question asks, to group the metrics of the call by.
+
+        Returns
+        -------
+        BaseModel
+            The parsed response from the model as an instance of the provided response_format.
+        """
+        messages = self.attach_image(self.get_image_messages(question))
+        with inference_metrics.measure(
+            question_type, get_payload_bytes(messages)
+        ) as call:
+            return await self.backend.parse_async(
+                INFERENCE_MODEL, messages, response_format, call
+            )
 
     def get_subtotal_with_chat(self, messages: list) -> tuple[Item, list]:
         """
-        Extract subtotal using chat conversation with image uploaded once.
+        Get the subtotal from the extracted receipt data.
 
         Parameters
         ----------
@@ -151,18 +586,16 @@ class Receipt:
         tuple[Item, list]
             A tuple containing the subtotal Item and updated messages list.
         """
-        messages.append({"role": "user", "content": "What is the subtotal amount?"})
-
-        response = self.run_inference(messages, Item)
-        subtotal = response
+        subtotal = Item(name="Subtotal", price=self.extract().subtotal)
 
+        messages.append({"role": "user", "content": SUBTOTAL_QUESTION})
         messages.append({"role": "assistant", "content": f"Subtotal: {subtotal.price}"})
 
         return subtotal, messages
 
     def get_items_with_chat(self, messages: list) -> tuple[Items, list]:
         """
-        Extract items using chat conversation with image uploaded once.
+        Get the items from the extracted receipt data.
 
         Parameters
         ----------
@@ -174,16 +607,9 @@ class Receipt:
         tuple[Items, list]
             A tuple containing the Items collection and updated messages list.
         """
-        messages.append(
-            {
-                "role": "user",
-                "content": "What are the individual items and their prices? Give me the list of item names and their prices.",
-            }
-        )
-
-        response = self.run_inference(messages, Items)
-        items = response
+        items = self.extract().get_items()
 
+        messages.append({"role": "user", "content": ITEMS_QUESTION})
         messages.append(
             {
                 "role": "assistant",
@@ -195,7 +621,7 @@ class Receipt:
 
     def get_service_charge_with_chat(self, messages: list) -> tuple[Item, list]:
         """
-        Extract service charge using chat conversation with image uploaded once.
+        Get the service charge from the extracted receipt data.
 
         Parameters
         ----------
@@ -207,17 +633,11 @@ class Receipt:
         tuple[Item, list]
             A tuple containing the service charge Item and updated messages list.
         """
-        messages.append(
-            {
-                "role": "user",
-                "content": "What is the service charge, tip, or gratuity amount? If none is found, return 0.",
-            }
+        service_charge = Item(
+            name="Service charge", price=self.extract().service_charge
         )
 
-        response = self.run_inference(messages, Item)
-        service_charge = response
-        service_charge.name = "Service charge"
-
+        messages.append({"role": "user", "content": SERVICE_CHARGE_QUESTION})
         messages.append(
             {"role": "assistant", "content": f"Service charge: {service_charge.price}"}
         )
@@ -226,7 +646,7 @@ class Receipt:
 
     def get_tax_with_chat(self, messages: list) -> tuple[Item, list]:
         """
-        Extract tax using chat conversation with image uploaded once.
+        Get the tax from the extracted receipt data.
 
         Parameters
         ----------
@@ -238,11 +658,9 @@ class Receipt:
         tuple[Item, list]
             A tuple containing the tax Item and updated messages list.
         """
-        messages.append({"role": "user", "content": "What is the tax amount?"})
-
-        response = self.run_inference(messages, Item)
-        tax = response
+        tax = Item(name="Tax", price=self.extract().tax)
 
+        messages.append({"role": "user", "content": TAX_QUESTION})
         messages.append({"role": "assistant", "content": f"Tax: {tax.price}"})
 
         return tax, messages
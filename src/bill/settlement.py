@@ -0,0 +1,533 @@
+from array import array
+from bisect import bisect_left
+from bill.money import allocate, to_cents
+from bill.person import Person
+from bill.receipts import Items, Item
+from pydantic import BaseModel
+
+
+class ShareChange(BaseModel):
+    """
+    A person's updated figures after an item was toggled.
+    """
+
+    person_index: int
+    share: float
+    subtotal: float
+    extras: list[float]
+    total: float
+
+
+class Settlement:
+    """
+    Shares of a receipt compiled once from persons, items, and extras.
+
+    All of the facts the calculator needs (who shares each item, split counts,
+    person subtotals, the receipt subtotal and each person's ratio of it) are
+    derived in a single pass over the persons' item assignments, so every query
+    afterwards is a lookup.
+    """
+
+    def __init__(self, persons: list[Person], items: Items, extras: Items):
+        """
+        Compile the settlement for persons, items, and extras.
+
+        Parameters
+        ----------
+        persons: list[Person]
+            List of Person objects representing the people splitting the bill
+        items: Items
+            Items object containing the main items to be split
+        extras: Items
+            Items object containing additional items (tax, tip, etc.) to be split
+        """
+        self.persons = persons
+        self.items = items
+        self.extras = extras
+
+        self.person_positions = {id(person): i for i, person in enumerate(persons)}
+        self.receipt_subtotal = items.get_sum()
+
+        self.compile()
+
+    def compile(self):
+        """
+        Derive sharers, split counts, subtotals, ratios and totals.
+        """
+        item_count = len(self.items.items)
+        self.sharers: list[set[int]] = [set() for _ in range(item_count)]
+        for person_index, person in enumerate(self.persons):
+            for item_index in person.items:
+                if 0 <= item_index < item_count:
+                    self.sharers[item_index].add(person_index)
+
+        self.split_counts = [len(sharers) for sharers in self.sharers]
+
+        self.subtotals = [0.0] * len(self.persons)
+        for item, sharers in zip(self.items.items, self.sharers):
+            if sharers:
+                share = item.price / len(sharers)
+                for person_index in sharers:
+                    self.subtotals[person_index] += share
+
+        self.ratios = [self.get_ratio(subtotal) for subtotal in self.subtotals]
+        self.totals = [
+            self.get_total(subtotal, ratio)
+            for subtotal, ratio in zip(self.subtotals, self.ratios)
+        ]
+
+    def get_ratio(self, subtotal: float) -> float:
+        """
+        Get a person's proportion of the receipt subtotal.
+        """
+        if not self.receipt_subtotal:
+            return 0.0
+        return subtotal / self.receipt_subtotal
+
+    def get_total(self, subtotal: float, ratio: float) -> float:
+        """
+        Get a person's total from their subtotal and their ratio of every extra.
+        """
+        return subtotal + sum(extra.price * ratio for extra in self.extras.items)
+
+    def item_index(self, item: Item) -> int:
+        """
+        Get the position of an item in the receipt items.
+        """
+        return self.items.index_of(item)
+
+    def person_index(self, person: Person) -> int:
+        """
+        Get the position of a person in the persons list.
+        """
+        try:
+            return self.person_positions[id(person)]
+        except KeyError:
+            return self.persons.index(person)
+
+    def is_sharing(self, item_index: int, person_index: int) -> bool:
+        """
+        Check whether a person shares the item at item_index.
+        """
+        return person_index in self.sharers[item_index]
+
+    def get_split_count(self, item_index: int) -> int:
+        """
+        Get the number of persons sharing the item at item_index.
+        """
+        return self.split_counts[item_index]
+
+    def get_share(self, item_index: int, person_index: int) -> float:
+        """
+        Get a person's share of the item at item_index.
+        """
+        if not self.is_sharing(item_index, person_index):
+            return 0.0
+        return self.items.items[item_index].price / self.split_counts[item_index]
+
+    def get_subtotal(self, person_index: int) -> float:
+        """
+        Get the sum of a person's shares of all items.
+        """
+        return self.subtotals[person_index]
+
+    def get_extra(self, extra: Item, person_index: int) -> float:
+        """
+        Get a person's share of an extra, proportional to their subtotal.
+        """
+        return extra.price * self.ratios[person_index]
+
+    def get_person_total(self, person_index: int) -> float:
+        """
+        Get a person's subtotal plus their share of every extra.
+        """
+        return self.totals[person_index]
+
+    def get_person_shares(self, person_index: int) -> list[float]:
+        """
+        Get a person's shares of every item, in receipt order.
+        """
+        return [
+            self.get_share(item_index, person_index)
+            for item_index in range(len(self.items.items))
+        ]
+
+    def get_item_shares(self, item_index: int) -> list[float]:
+        """
+        Get every person's share of the item at item_index, in persons order.
+        """
+        return [
+            self.get_share(item_index, person_index)
+            for person_index in range(len(self.persons))
+        ]
+
+    def get_extra_shares(self, extra: Item) -> list[float]:
+        """
+        Get every person's share of an extra, in persons order.
+        """
+        return [extra.price * ratio for ratio in self.ratios]
+
+    def get_change(self, item_index: int, person_index: int) -> ShareChange:
+        """
+        Get a person's current figures for the item at item_index.
+        """
+        return ShareChange(
+            person_index=person_index,
+            share=self.get_share(item_index, person_index),
+            subtotal=self.get_subtotal(person_index),
+            extras=[self.get_extra(extra, person_index) for extra in self.extras.items],
+            total=self.get_person_total(person_index),
+        )
+
+    def toggle(self, person_index: int, item_index: int) -> list[ShareChange]:
+        """
+        Toggle an item for a person and update only the figures it affects.
+
+        Only the toggled item's split count and the subtotals, extras and
+        totals of the persons sharing it (before or after the toggle) change,
+        so the update costs O(sharers of the item).
+
+        Parameters
+        ----------
+        person_index: int
+            Index of the person toggling the item
+        item_index: int
+            Index of the item being toggled
+
+        Returns
+        -------
+        list[ShareChange]
+            Updated figures for every affected person, in persons order
+        """
+        self.persons[person_index].update_item(item_index)
+
+        sharers = self.sharers[item_index]
+        price = self.items.items[item_index].price
+        old_sharers = set(sharers)
+        old_share = price / len(old_sharers) if old_sharers else 0.0
+
+        sharers.symmetric_difference_update({person_index})
+        self.split_counts[item_index] = len(sharers)
+        new_share = price / len(sharers) if sharers else 0.0
+
+        affected = sorted(old_sharers | sharers)
+        for i in affected:
+            if i in old_sharers:
+                self.subtotals[i] -= old_share
+            if i in sharers:
+                self.subtotals[i] += new_share
+            self.ratios[i] = self.get_ratio(self.subtotals[i])
+            self.totals[i] = self.get_total(self.subtotals[i], self.ratios[i])
+
+        return [self.get_change(item_index, i) for i in affected]
+
+
+class VectorSettlement(Settlement):
+    """
+    Settlement computed with NumPy array operations.
+
+    The assignment of items to persons is a boolean persons x items matrix and
+    the prices are a vector, so shares, subtotals, extras and totals for every
+    person come out of a handful of array operations. Suited to large groups
+    with many items; requires the optional numpy dependency.
+    """
+
+    def compile(self):
+        import numpy as np
+
+        item_count = len(self.items.items)
+        self.assignments = np.zeros((len(self.persons), item_count), dtype=bool)
+        for person_index, person in enumerate(self.persons):
+            item_indexes = [i for i in person.items if 0 <= i < item_count]
+            self.assignments[person_index, item_indexes] = True
+
+        self.prices = np.fromiter(
+            (item.price for item in self.items.items), dtype=float, count=item_count
+        )
+        self.extra_prices = np.fromiter(
+            (extra.price for extra in self.extras.items),
+            dtype=float,
+            count=len(self.extras.items),
+        )
+
+        self.split_counts = self.assignments.sum(axis=0)
+        item_shares = np.divide(
+            self.prices,
+            self.split_counts,
+            out=np.zeros_like(self.prices),
+            where=self.split_counts > 0,
+        )
+        self.shares = self.assignments * item_shares
+        self.subtotals = self.shares.sum(axis=1)
+
+        if self.receipt_subtotal:
+            self.ratios = self.subtotals / self.receipt_subtotal
+        else:
+            self.ratios = np.zeros_like(self.subtotals)
+        self.extra_shares = np.outer(self.ratios, self.extra_prices)
+        self.totals = self.subtotals + self.extra_shares.sum(axis=1)
+
+    def is_sharing(self, item_index: int, person_index: int) -> bool:
+        return bool(self.assignments[person_index, item_index])
+
+    def get_split_count(self, item_index: int) -> int:
+        return int(self.split_counts[item_index])
+
+    def get_share(self, item_index: int, person_index: int) -> float:
+        return float(self.shares[person_index, item_index])
+
+    def get_subtotal(self, person_index: int) -> float:
+        return float(self.subtotals[person_index])
+
+    def get_extra(self, extra: Item, person_index: int) -> float:
+        return float(extra.price * self.ratios[person_index])
+
+    def get_person_total(self, person_index: int) -> float:
+        return float(self.totals[person_index])
+
+    def get_person_shares(self, person_index: int) -> list[float]:
+        return self.shares[person_index].tolist()
+
+    def get_item_shares(self, item_index: int) -> list[float]:
+        return self.shares[:, item_index].tolist()
+
+    def toggle(self, person_index: int, item_index: int) -> list[ShareChange]:
+        import numpy as np
+
+        self.persons[person_index].update_item(item_index)
+
+        column = self.assignments[:, item_index]
+        old_column = column.copy()
+        old_shares = self.shares[:, item_index].copy()
+
+        column[person_index] = not column[person_index]
+        split_count = int(column.sum())
+        self.split_counts[item_index] = split_count
+        if split_count:
+            self.shares[:, item_index] = column * (
+                self.prices[item_index] / split_count
+            )
+        else:
+            self.shares[:, item_index] = 0.0
+
+        affected = np.flatnonzero(old_column | column)
+        self.subtotals[affected] += (
+            self.shares[affected, item_index] - old_shares[affected]
+        )
+        if self.receipt_subtotal:
+            self.ratios[affected] = self.subtotals[affected] / self.receipt_subtotal
+        self.extra_shares[affected] = np.outer(self.ratios[affected], self.extra_prices)
+        self.totals[affected] = self.subtotals[affected] + self.extra_shares[
+            affected
+        ].sum(axis=1)
+
+        return [self.get_change(item_index, int(i)) for i in affected]
+
+    def get_extra_shares(self, extra: Item) -> list[float]:
+        try:
+            return self.extra_shares[:, self.extras.index_of(extra)].tolist()
+        except ValueError:
+            return (self.ratios * extra.price).tolist()
+
+
+class CentsSettlement(Settlement):
+    """
+    Settlement in integer cents with largest-remainder rounding.
+
+    Item and extra prices are converted to cents once and kept in arrays. Each item
+    is split equally among its sharers and each extra proportionally to the person
+    subtotals, handing out leftover cents by largest remainder. Every person column
+    therefore adds up exactly to the receipt, with no float drift to reconcile.
+    """
+
+    def compile(self):
+        person_count = len(self.persons)
+        item_count = len(self.items.items)
+
+        self.item_cents = array(
+            "q", (to_cents(item.price) for item in self.items.items)
+        )
+        # Persons are visited in order, so every item's sharers come out sorted
+        self.sharers = [array("q") for _ in range(item_count)]
+        for person_index, person in enumerate(self.persons):
+            for item_index in person.items:
+                if 0 <= item_index < item_count:
+                    self.sharers[item_index].append(person_index)
+        self.split_counts = [len(item_sharers) for item_sharers in self.sharers]
+        self.share_cents = [self.split_item(i) for i in range(item_count)]
+
+        self.subtotal_cents = array("q", bytes(8 * person_count))
+        self.unassigned_cents = 0
+        for item_index in range(item_count):
+            self.add_item_cents(item_index, 1)
+
+        self.allocate_extras()
+
+    def split_item(self, item_index: int) -> array:
+        """
+        Split an item's cents among its sharers, aligned to the sorted sharers.
+
+        The leftover cents of each item start at a different rank, rotating with the
+        item index, so no sharer pays the extra cent of every uneven split.
+        """
+        split_count = self.split_counts[item_index]
+        if not split_count:
+            return array("q")
+
+        share, remainder = divmod(self.item_cents[item_index], split_count)
+        return array(
+            "q",
+            [
+                share + (1 if (rank - item_index) % split_count < remainder else 0)
+                for rank in range(split_count)
+            ],
+        )
+
+    def get_rank(self, item_index: int, person_index: int) -> int | None:
+        """
+        Get a person's position among the sorted sharers of an item, if sharing it.
+        """
+        item_sharers = self.sharers[item_index]
+        rank = bisect_left(item_sharers, person_index)
+        if rank < len(item_sharers) and item_sharers[rank] == person_index:
+            return rank
+        return None
+
+    def add_item_cents(self, item_index: int, sign: int):
+        """
+        Add (sign=1) or remove (sign=-1) an item's allocation from the subtotals.
+        """
+        item_sharers = self.sharers[item_index]
+        if not item_sharers:
+            self.unassigned_cents += sign * self.item_cents[item_index]
+            return
+
+        for person_index, cents in zip(item_sharers, self.share_cents[item_index]):
+            self.subtotal_cents[person_index] += sign * cents
+
+    def allocate_extras(self):
+        """
+        Allocate every extra by the person subtotals and derive the totals.
+
+        Unassigned items keep their proportion of each extra, as with the float
+        settlement, so the person columns only add up to the receipt once every
+        item is shared. With no subtotals at all, the extras are split evenly.
+        """
+        person_count = len(self.persons)
+        weights = list(self.subtotal_cents)
+        if self.unassigned_cents:
+            weights.append(self.unassigned_cents)
+        self.extra_cents = [
+            allocate(to_cents(extra.price), weights)[:person_count]
+            for extra in self.extras.items
+        ]
+        self.total_cents = array(
+            "q", map(sum, zip(self.subtotal_cents, *self.extra_cents))
+        )
+
+    def is_sharing(self, item_index: int, person_index: int) -> bool:
+        return self.get_rank(item_index, person_index) is not None
+
+    def get_share(self, item_index: int, person_index: int) -> float:
+        rank = self.get_rank(item_index, person_index)
+        if rank is None:
+            return 0.0
+        return self.share_cents[item_index][rank] / 100
+
+    def get_subtotal(self, person_index: int) -> float:
+        return self.subtotal_cents[person_index] / 100
+
+    def get_extra(self, extra: Item, person_index: int) -> float:
+        return self.extra_cents[self.extras.index_of(extra)][person_index] / 100
+
+    def get_person_total(self, person_index: int) -> float:
+        return self.total_cents[person_index] / 100
+
+    def get_item_shares(self, item_index: int) -> list[float]:
+        shares = [0.0] * len(self.persons)
+        for person_index, cents in zip(
+            self.sharers[item_index], self.share_cents[item_index]
+        ):
+            shares[person_index] = cents / 100
+        return shares
+
+    def get_extra_shares(self, extra: Item) -> list[float]:
+        return [cents / 100 for cents in self.extra_cents[self.extras.index_of(extra)]]
+
+    def get_change(self, item_index: int, person_index: int) -> ShareChange:
+        return ShareChange(
+            person_index=person_index,
+            share=self.get_share(item_index, person_index),
+            subtotal=self.get_subtotal(person_index),
+            extras=[cents[person_index] / 100 for cents in self.extra_cents],
+            total=self.get_person_total(person_index),
+        )
+
+    def toggle(self, person_index: int, item_index: int) -> list[ShareChange]:
+        """
+        Toggle an item for a person and reallocate in cents.
+
+        The toggled item is reallocated among its sharers only, but a changed
+        subtotal can move a leftover cent of an extra to anyone, so the extras are
+        reallocated for everyone. Changes are returned for every person whose
+        figures moved.
+        """
+        self.persons[person_index].update_item(item_index)
+
+        old_sharers = self.sharers[item_index]
+        old_totals = self.total_cents
+        self.add_item_cents(item_index, -1)
+
+        new_sharers = set(old_sharers)
+        new_sharers.symmetric_difference_update({person_index})
+        self.sharers[item_index] = array("q", sorted(new_sharers))
+        self.split_counts[item_index] = len(new_sharers)
+        self.share_cents[item_index] = self.split_item(item_index)
+        self.add_item_cents(item_index, 1)
+
+        self.allocate_extras()
+
+        affected = set(old_sharers) | new_sharers
+        affected.update(
+            i
+            for i, (old_total, total) in enumerate(zip(old_totals, self.total_cents))
+            if total != old_total
+        )
+        return [self.get_change(item_index, i) for i in sorted(affected)]
+
+
+SETTLEMENT_BACKENDS = {
+    "python": Settlement,
+    "numpy": VectorSettlement,
+    "cents": CentsSettlement,
+}
+
+
+def compile_settlement(
+    persons: list[Person], items: Items, extras: Items, backend: str = "python"
+) -> Settlement:
+    """
+    Compile a settlement with the named backend.
+
+    Parameters
+    ----------
+    persons: list[Person]
+        List of Person objects representing the people splitting the bill
+    items: Items
+        Items object containing the main items to be split
+    extras: Items
+        Items object containing additional items (tax, tip, etc.) to be split
+    backend: str
+        "python" for the pure-Python settlement, "numpy" for the vectorized one or
+        "cents" for the integer-cents one
+
+    Returns
+    -------
+    Settlement
+        The compiled settlement
+    """
+    try:
+        settlement_class = SETTLEMENT_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown settlement backend: {backend}")
+    return settlement_class(persons, items, extras)
@@ -0,0 +1,120 @@
+from bill.clients import get_call_timeout
+from bill.receipts import Receipt, ReceiptData
+from concurrent.futures import Future, ThreadPoolExecutor
+import asyncio
+from pathlib import Path
+from logging import getLogger
+from threading import Lock, Thread
+import os
+
+log = getLogger(__file__)
+
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "4"))
+
+# "single" asks one question for everything, "concurrent" asks each question at once
+EXTRACTION_MODE = os.environ.get("EXTRACTION_MODE", "single")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+MISSING = "missing"
+
+_executor = ThreadPoolExecutor(
+    max_workers=ANALYSIS_WORKERS, thread_name_prefix="receipt-analysis"
+)
+_jobs: dict[str, Future] = {}
+_jobs_lock = Lock()
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the event loop the concurrent extractions run on, started on first use.
+
+    Every receipt is extracted on this one loop, so they share its AsyncOpenAI client
+    and the connections in its pool instead of opening a new pool per receipt.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            Thread(
+                target=_loop.run_forever, name="receipt-analysis-loop", daemon=True
+            ).start()
+    return _loop
+
+
+def analyze(image_file_path: Path) -> ReceiptData:
+    receipt = Receipt(image_file_path.read_bytes())
+    if EXTRACTION_MODE == "concurrent":
+        extraction = receipt.extract_concurrently()
+        return asyncio.run_coroutine_threadsafe(extraction, get_loop()).result()
+    return receipt.extract()
+
+
+def start(image_file_path: Path) -> Future:
+    """
+    Start extracting a receipt image in the background, replacing any earlier job.
+    """
+    key = str(image_file_path)
+    with _jobs_lock:
+        previous_job = _jobs.pop(key, None)
+        if previous_job:
+            previous_job.cancel()
+        job = _executor.submit(analyze, image_file_path)
+        _jobs[key] = job
+    return job
+
+
+def get_state(image_file_path: Path) -> str:
+    with _jobs_lock:
+        job = _jobs.get(str(image_file_path))
+
+    if job is None:
+        return MISSING
+    if job.running():
+        return RUNNING
+    if not job.done():
+        return PENDING
+    if job.cancelled() or job.exception():
+        return FAILED
+    return DONE
+
+
+def get_result(
+    image_file_path: Path, timeout: float | None = None
+) -> ReceiptData | None:
+    """
+    Wait for the extraction of a receipt image.
+
+    Returns None if no job was started for the image or it failed, so callers can
+    fall back to extracting in the request.
+
+    Parameters
+    ----------
+    image_file_path : Path
+        The receipt image the job was started for.
+    timeout : float | None
+        Seconds to wait, by default as long as an inference call may take with its
+        retries.
+
+    Raises
+    ------
+    TimeoutError
+        If the job is not done within timeout, such as when the call is stuck.
+    """
+    with _jobs_lock:
+        job = _jobs.get(str(image_file_path))
+
+    if job is None:
+        return None
+
+    try:
+        return job.result(timeout=get_call_timeout() if timeout is None else timeout)
+    except TimeoutError:
+        raise
+    except Exception as e:
+        log.warning(f"Background receipt analysis failed: {e}")
+        return None
@@ -1,3 +1,4 @@
+import analysis
 import session_data
 from flask import (
     render_template,
@@ -6,8 +7,7 @@ from flask import (
     request,
     jsonify,
 )
-from bill.receipts import Items, Item, Receipt
-from pathlib import Path
+from bill.receipts import Items, Item
 from logging import getLogger
 from items import get_current_items
 
@@ -21,18 +21,12 @@ def get_receipt_extras(session: dict) -> Items:
         image_file_path = session_data.session_item_path(
             session, session_data.IMAGE_FILE
         )
-        image_data = Path(image_file_path).read_bytes()
-        receipt = Receipt(image_data)
-
-        chat_messages = list(session_data.get_chat_messages(session))
-        service_charge, chat_messages = receipt.get_service_charge_with_chat(
-            chat_messages
-        )
-        tax, chat_messages = receipt.get_tax_with_chat(chat_messages)
-
-        session_data.save_chat_messages(chat_messages, session)
-
-        return Items(items=[service_charge, tax])
+        receipt_data = analysis.get_result(image_file_path)
+        receipt_data = receipt_data or analysis.analyze(image_file_path)
+        return receipt_data.get_extras()
+    except TimeoutError:
+        log.warning("Background receipt analysis timed out, using default extras")
+        return None
     except Exception as e:
         log.warning(f"Error extracting service charge and tax from receipt image: {e}")
         return None
@@ -73,7 +67,7 @@ def add_extra():
     extras = get_current_extras(session)
 
     new_extra = Item(name=name, price=price)
-    extras.items.append(new_extra)
+    extras.append(new_extra)
 
     session_data.save_extras_file(extras, session)
 
@@ -0,0 +1,102 @@
+from bill.images import load_image_data
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging import getLogger
+from threading import BoundedSemaphore, Lock
+import multiprocessing
+import os
+
+log = getLogger(__file__)
+
+# Processes decoding and encoding uploads, so the work does not hold the GIL of the
+# process serving requests
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+
+# Uploads being processed or waiting for a worker before more are turned away
+IMAGE_QUEUE_DEPTH = int(os.environ.get("IMAGE_QUEUE_DEPTH", str(2 * IMAGE_WORKERS)))
+
+# Seconds an upload waits for a place in the queue before it is turned away
+IMAGE_QUEUE_WAIT = float(os.environ.get("IMAGE_QUEUE_WAIT", "0"))
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = Lock()
+_queue_slots = BoundedSemaphore(IMAGE_QUEUE_DEPTH)
+
+
+class IngestionBusy(Exception):
+    """
+    Raised when the image queue is full.
+    """
+
+
+class IngestionFailed(Exception):
+    """
+    Raised when a worker process died while encoding an upload.
+    """
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Workers start from a clean server process, as forking the
+                # threads of the web server could copy a lock another thread holds
+                _executor = ProcessPoolExecutor(
+                    max_workers=IMAGE_WORKERS,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+    return _executor
+
+
+def discard_executor(executor: ProcessPoolExecutor):
+    """
+    Drop a broken executor, so the next upload starts a new one.
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def load(image_data: bytes) -> bytes:
+    """
+    Encode uploaded image data with bill.images.load_image in a worker process.
+
+    Parameters
+    ----------
+    image_data : bytes
+        The uploaded image file.
+
+    Returns
+    -------
+    bytes
+        The encoded receipt image.
+
+    Raises
+    ------
+    IngestionBusy
+        If IMAGE_QUEUE_DEPTH uploads are already queued and none finished within
+        IMAGE_QUEUE_WAIT seconds.
+    IngestionFailed
+        If a worker process died, for example killed for running out of memory.
+    """
+    if not _queue_slots.acquire(timeout=IMAGE_QUEUE_WAIT):
+        log.warning(f"Image queue full with {IMAGE_QUEUE_DEPTH} uploads")
+        raise IngestionBusy()
+
+    try:
+        executor = get_executor()
+        try:
+            return executor.submit(load_image_data, image_data).result()
+        except BrokenProcessPool as e:
+            log.error(f"Image worker process died: {e}")
+            discard_executor(executor)
+            raise IngestionFailed(
+                "The receipt image could not be processed, please try again"
+            ) from e
+    finally:
+        _queue_slots.release()
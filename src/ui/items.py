@@ -1,15 +1,19 @@
+import analysis
 import session_data
 from flask import (
     render_template,
     session,
     Blueprint,
+    Response,
     request,
     jsonify,
+    stream_with_context,
 )
-from bill.receipts import Receipt, Items, Item
-from pathlib import Path
+from bill.receipts import Items, Item, Receipt, ReceiptData
 from logging import getLogger
 from persons import get_current_persons, save_persons_file
+from bill.person import ItemSet
+from typing import Iterator
 
 log = getLogger(__file__)
 
@@ -24,24 +28,87 @@ def get_current_items(session: dict) -> Items | None:
         return None
 
 
-def get_receipt_image_items(session: dict) -> Items:
-    image_file_path = session_data.session_item_path(session, session_data.IMAGE_FILE)
-    image_data = Path(image_file_path).read_bytes()
-    receipt = Receipt(image_data)
+def stream_receipt_image_items(session: dict) -> Iterator[Item]:
+    """
+    Yield the items of the receipt image as they are extracted, then save them.
 
-    chat_messages = receipt.start_analysis()
-    items, chat_messages = receipt.get_items_with_chat(chat_messages)
-    session_data.save_chat_messages(chat_messages, session)
-    return items
+    A background analysis that is queued, running or done is waited for instead, so
+    the image is not sent to the model twice.
+    """
+    image_file_path = session_data.session_item_path(session, session_data.IMAGE_FILE)
+    receipt_data = None
+    if analysis.get_state(image_file_path) in (
+        analysis.PENDING,
+        analysis.RUNNING,
+        analysis.DONE,
+    ):
+        try:
+            receipt_data = analysis.get_result(image_file_path)
+        except TimeoutError:
+            log.warning("Background receipt analysis timed out, extracting again")
+
+    if receipt_data is None:
+        receipt = Receipt(image_file_path.read_bytes())
+        yield from receipt.stream_items()
+        receipt_data = receipt.data
+    else:
+        yield from receipt_data.items
+
+    if session_data.get_current_extras(session) is None:
+        session_data.save_extras_file(receipt_data.get_extras(), session)
+    session_data.save_items_file(receipt_data.get_items(), session)
+
+
+def save_empty_receipt(session: dict):
+    """
+    Save an empty list of items and zero extras, so they can be added by hand.
+    """
+    receipt_data = ReceiptData(items=[], subtotal=0.0, service_charge=0.0, tax=0.0)
+    if session_data.get_current_extras(session) is None:
+        session_data.save_extras_file(receipt_data.get_extras(), session)
+    session_data.save_items_file(receipt_data.get_items(), session)
+
+
+def format_event(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
 
 
 @items_page.route("/items", methods=["GET"])
 def list_items():
     items = get_current_items(session)
-    items = items or get_receipt_image_items(session)
-    session_data.save_items_file(items, session)
+    if items is None:
+        # The page fills in from /items/stream as the receipt is read
+        return render_template("items.html", items=[], streaming=True)
+
+    return render_template("items.html", items=items.items, streaming=False)
 
-    return render_template("items.html", items=items.items)
+
+@items_page.route("/items/stream", methods=["GET"])
+def stream_items():
+    """
+    Send the items as Server-Sent Events: one "item" event per item, then "done".
+    """
+    items = get_current_items(session)
+
+    def generate():
+        try:
+            receipt_items = (
+                items.items if items else stream_receipt_image_items(session)
+            )
+            for item in receipt_items:
+                yield format_event("item", item.model_dump_json())
+        except Exception as e:
+            log.error(f"Streaming receipt items failed: {e}")
+            save_empty_receipt(session)
+            yield format_event("failed", "{}")
+            return
+        yield format_event("done", "{}")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @items_page.route("/get_persons", methods=["GET"])
@@ -59,7 +126,7 @@ def add_item():
     items = get_current_items(session)
 
     new_item = Item(name=name, price=price)
-    items.items.append(new_item)
+    items.append(new_item)
 
     session_data.save_items_file(items, session)
 
@@ -100,13 +167,12 @@ def prepare_split():
     item_count = len(items.items)
     persons = get_current_persons(session)
 
-    persons_items = map(lambda person: set(person.items), persons)
-    all_shared_items = set.union(*persons_items)
-    unshared_items = set(range(item_count)) - all_shared_items
+    all_shared_items = ItemSet.union(*(person.items for person in persons))
+    unshared_items = ItemSet(range(item_count)) - all_shared_items
 
     if unshared_items:
         for person in persons:
-            person.items = sorted(set(person.items + list(unshared_items)))
+            person.items |= unshared_items
 
         save_persons_file(persons, session)
 
@@ -43,6 +43,20 @@ const editSubtitle = document.getElementById(
 const loadingOverlay = document.getElementById(
   "loading-overlay",
 ) as HTMLElement;
+const itemsList = document.getElementById("items-list") as HTMLDivElement;
+const itemsStreaming = document.getElementById(
+  "items-streaming",
+) as HTMLDivElement;
+const itemsTotal = document.getElementById("items-total") as HTMLDivElement;
+const itemsTotalPrice = document.getElementById(
+  "items-total-price",
+) as HTMLSpanElement;
+const itemsEmpty = document.getElementById("items-empty") as HTMLDivElement;
+
+interface StreamedItem {
+  name: string;
+  price: number;
+}
 
 function showItemsList(): void {
   itemsListView.classList.remove("hidden");
@@ -94,20 +108,81 @@ function hideLoadingOverlay(): void {
   loadingOverlay.classList.add("hidden");
 }
 
+function setupItemClickHandler(itemElement: Element): void {
+  itemElement.addEventListener("click", () => {
+    const index = parseInt(itemElement.getAttribute("data-item-index") || "0");
+    const name = itemElement.getAttribute("data-item-name") || "";
+    const price = parseFloat(
+      itemElement.getAttribute("data-item-price") || "0",
+    );
+    showEditItem(index, name, price);
+  });
+}
+
 function setupItemClickHandlers(): void {
   const itemElements = document.querySelectorAll("[data-item-index]");
-  itemElements.forEach((itemElement) => {
-    itemElement.addEventListener("click", () => {
-      const index = parseInt(
-        itemElement.getAttribute("data-item-index") || "0",
-      );
-      const name = itemElement.getAttribute("data-item-name") || "";
-      const price = parseFloat(
-        itemElement.getAttribute("data-item-price") || "0",
-      );
-      showEditItem(index, name, price);
-    });
+  itemElements.forEach(setupItemClickHandler);
+}
+
+function appendItem(index: number, item: StreamedItem): void {
+  const itemElement = document.createElement("div");
+  itemElement.className =
+    "flex justify-between items-center p-4 bg-slate-800/50 rounded-lg border border-slate-700 cursor-pointer hover:bg-slate-800/70 transition-colors";
+  itemElement.setAttribute("data-item-index", index.toString());
+  itemElement.setAttribute("data-item-name", item.name);
+  itemElement.setAttribute("data-item-price", item.price.toString());
+
+  const nameElement = document.createElement("span");
+  nameElement.className = "font-medium text-slate-100";
+  nameElement.textContent = item.name;
+  const priceElement = document.createElement("span");
+  priceElement.className = "text-blue-400 font-semibold";
+  priceElement.textContent = `$${item.price.toFixed(2)}`;
+
+  itemElement.append(nameElement, priceElement);
+  itemsList.insertBefore(itemElement, itemsStreaming);
+  setupItemClickHandler(itemElement);
+}
+
+function streamItems(): void {
+  let itemCount = 0;
+  let total = 0;
+
+  addItemButton.disabled = true;
+  splitButtonNav.disabled = true;
+
+  const events = new EventSource("/items/stream");
+
+  const finish = (): void => {
+    events.close();
+    itemsStreaming.classList.add("hidden");
+    if (itemCount === 0) {
+      itemsEmpty.classList.remove("hidden");
+    }
+    addItemButton.disabled = false;
+    splitButtonNav.disabled = false;
+  };
+
+  events.addEventListener("item", (event) => {
+    const item = JSON.parse((event as MessageEvent).data) as StreamedItem;
+    appendItem(itemCount, item);
+    itemCount += 1;
+    total += item.price;
+    itemsTotalPrice.textContent = `$${total.toFixed(2)}`;
+    itemsTotal.classList.remove("hidden");
   });
+
+  events.addEventListener("done", finish);
+
+  events.addEventListener("failed", () => {
+    finish();
+    alert("Could not read the receipt. Please add the items by hand.");
+  });
+
+  events.onerror = () => {
+    // Without this the browser would reconnect and extract the receipt again
+    finish();
+  };
 }
 
 function handleCancel(): void {
@@ -240,6 +315,10 @@ document.addEventListener("DOMContentLoaded", () => {
 
   setupItemClickHandlers();
 
+  if (itemsList.getAttribute("data-streaming") === "true") {
+    streamItems();
+  }
+
   editItemForm.addEventListener("submit", (e) => {
     e.preventDefault();
     handleSave();
@@ -1,11 +1,13 @@
-from flask import render_template, request, flash, url_for, redirect, session
+from flask import Response, render_template, request, flash, url_for, redirect, session
 from app import app
-from bill.images import load_image
+from bill.clients import warm_client as warm_inference_client
+from bill.metrics import inference_metrics
+import analysis
+import ingestion
 import session_data
 from tempfile import TemporaryDirectory
 import click
 
-
 _data_directory = None
 
 
@@ -15,9 +17,15 @@ def home():
     return render_template("index.html")
 
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(inference_metrics.render(), mimetype="text/plain")
+
+
 def save_image(image_file, session):
     image_file_path = session_data.session_item_path(session, session_data.IMAGE_FILE)
-    image_file_path.write_bytes(load_image(image_file))
+    image_file_path.write_bytes(ingestion.load(image_file.read()))
+    analysis.start(image_file_path)
 
 
 @app.route("/", methods=["POST"])
@@ -30,6 +38,12 @@ def read_receipt_image():
         return redirect(url_for("persons.list_persons"))
     except KeyError:
         flash("No file uploaded")
+    except ingestion.IngestionBusy:
+        flash("Too many receipts are being uploaded, please try again shortly")
+        return render_template("index.html"), 503, {"Retry-After": "5"}
+    except ingestion.IngestionFailed as e:
+        flash(str(e))
+        return render_template("index.html"), 500
     except Exception as e:
         flash(str(e))
 
@@ -38,7 +52,15 @@ def read_receipt_image():
 
 @click.command()
 @click.option("--debug", default=False, is_flag=True)
-def run_server(debug: bool):
+@click.option(
+    "--warm-client",
+    default=False,
+    is_flag=True,
+    help="Connect to the inference API before serving.",
+)
+def run_server(debug: bool, warm_client: bool):
+    if warm_client:
+        warm_inference_client()
     app.run(host="0.0.0.0", port=8000, debug=debug)
 
 
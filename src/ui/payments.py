@@ -5,19 +5,81 @@ from flask import (
     request,
     Response,
     jsonify,
+    send_file,
 )
 from bill.calculator import Calculator
 from logging import getLogger
 from items import get_current_items
 from extras import get_current_extras
 from persons import get_current_persons
-from session_data import save_persons_file
+from session_data import (
+    EXTRAS_FILE,
+    ITEMS_FILE,
+    PERSONS_FILE,
+    save_persons_file,
+    session_item_path,
+)
 from datetime import datetime
+from tempfile import TemporaryFile
+from threading import Lock
 
 log = getLogger(__file__)
 
 payments_page = Blueprint("payments", __name__)
 
+MAX_CACHED_CALCULATORS = 128
+
+# Compiled calculator of each session with the signature of the files it was compiled
+# from, so a tap toggles one item instead of compiling the whole receipt again
+_calculators: dict[str, tuple[tuple, Calculator]] = {}
+_calculators_lock = Lock()
+
+
+def get_files_signature(session: dict) -> tuple:
+    signature = []
+    for file in (PERSONS_FILE, ITEMS_FILE, EXTRAS_FILE):
+        try:
+            stat = session_item_path(session, file).stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def get_session_calculator(session: dict) -> Calculator:
+    """
+    Take the compiled calculator of the session out of the cache, compiling it again
+    if the persons, items or extras files changed since it was cached.
+    """
+    key = str(session_item_path(session, PERSONS_FILE))
+    with _calculators_lock:
+        cached = _calculators.pop(key, None)
+    if cached and cached[0] == get_files_signature(session):
+        return cached[1]
+
+    return Calculator(
+        persons=get_current_persons(session),
+        items=get_current_items(session),
+        extras=get_current_extras(session),
+    )
+
+
+def cache_session_calculator(session: dict, calculator: Calculator):
+    """
+    Keep the calculator of the session until its files next change.
+    """
+    key = str(session_item_path(session, PERSONS_FILE))
+    with _calculators_lock:
+        _calculators[key] = (get_files_signature(session), calculator)
+        while len(_calculators) > MAX_CACHED_CALCULATORS:
+            del _calculators[next(iter(_calculators))]
+
+
+def is_index(value, length: int) -> bool:
+    return (
+        isinstance(value, int) and not isinstance(value, bool) and 0 <= value < length
+    )
+
 
 @payments_page.route("/payments", methods=["GET"])
 def payments_page_view():
@@ -82,11 +144,32 @@ def download_spreadsheet():
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     filename = f"{timestamp}.xlsx"
 
-    spreadsheet_bytes = calculator.get_shares_spreadsheet()
+    spreadsheet_file = TemporaryFile()
+    calculator.write_shares_spreadsheet(spreadsheet_file)
+    spreadsheet_file.seek(0)
 
-    return Response(
-        spreadsheet_bytes.getvalue(),
+    return send_file(
+        spreadsheet_file,
         mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=filename,
+    )
+
+
+@payments_page.route("/payments/csv", methods=["GET"])
+def download_csv():
+    items = get_current_items(session)
+    extras = get_current_extras(session)
+    persons = get_current_persons(session)
+
+    calculator = Calculator(persons=persons, items=items, extras=extras)
+
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    filename = f"{timestamp}.csv"
+
+    return Response(
+        calculator.iter_shares_csv(),
+        mimetype="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
@@ -97,29 +180,34 @@ def share_item():
     item_index = data.get("item_index")
     person_index = data.get("person_index")
 
-    persons = get_current_persons(session)
-    person = persons[person_index]
-    person.update_item(item_index)
-    save_persons_file(persons, session)
+    calculator = get_session_calculator(session)
+    if not (
+        is_index(item_index, len(calculator.items.items))
+        and is_index(person_index, len(calculator.persons))
+    ):
+        cache_session_calculator(session, calculator)
+        return jsonify({"success": False, "error": "No such item or person"}), 400
 
-    items = get_current_items(session)
-    extras = get_current_extras(session)
-    calculator = Calculator(persons=persons, items=items, extras=extras)
-    item = items.items[item_index]
-    share = calculator.get_person_share(item, person)
+    changes = calculator.update_item(person_index, item_index)
+    save_persons_file(calculator.persons, session)
+    cache_session_calculator(session, calculator)
 
-    person_subtotal = calculator.get_person_subtotal(person)
-    person_total = calculator.get_person_total(person)
+    items = calculator.items
+    item = items.items[item_index]
+    person_change = next(
+        change for change in changes if change.person_index == person_index
+    )
 
     return (
         jsonify(
             {
                 "success": True,
-                "share": share,
+                "share": person_change.share,
                 "item_name": item.name,
                 "item_price": item.price,
-                "person_subtotal": person_subtotal,
-                "person_total": person_total,
+                "person_subtotal": person_change.subtotal,
+                "person_total": person_change.total,
+                "changes": [change.model_dump() for change in changes],
             }
         ),
         200,
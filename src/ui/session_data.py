@@ -12,11 +12,10 @@ IMAGE_FILE = "image_file"
 ITEMS_FILE = "items_file"
 EXTRAS_FILE = "extras_file"
 PERSONS_FILE = "persons_file"
-CHAT_FILE = "chat_file"
 
 
 def start_new_receipt(session: dict):
-    for file in (IMAGE_FILE, ITEMS_FILE, EXTRAS_FILE, PERSONS_FILE, CHAT_FILE):
+    for file in (IMAGE_FILE, ITEMS_FILE, EXTRAS_FILE, PERSONS_FILE):
         try:
             os.remove(session_item_path(session, file))
         except FileNotFoundError:
@@ -27,7 +26,6 @@ def start_new_receipt(session: dict):
         ITEMS_FILE,
         EXTRAS_FILE,
         PERSONS_FILE,
-        CHAT_FILE,
     ]
 
     for key in keys_to_clear:
@@ -83,18 +81,3 @@ def get_current_extras(session: dict) -> Items | None:
     except Exception as e:
         log.warning(f"current list of extras is empty: {e}")
         return None
-
-
-def get_chat_messages(session: dict) -> list[dict]:
-    try:
-        chat_file = session_item_path(session, CHAT_FILE)
-        with open(chat_file, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        log.debug(f"chat file not yet initialized: {e}")
-        return []
-
-
-def save_chat_messages(messages: list[dict], session: dict):
-    with open(session_item_path(session, CHAT_FILE), "w") as chat_file:
-        json.dump(messages, chat_file, indent=4)
@@ -0,0 +1,80 @@
+from random import Random
+from bill.person import Person
+from bill.receipts import Items, Item
+
+
+def generate_items(count: int, rng: Random) -> Items:
+    """
+    Generate receipt items priced between 1.00 and 99.99.
+    """
+    return Items(
+        items=[
+            Item(name=f"Item {i}", price=rng.randint(100, 9999) / 100)
+            for i in range(count)
+        ]
+    )
+
+
+def generate_persons(
+    count: int, item_count: int, density: float, rng: Random
+) -> list[Person]:
+    """
+    Generate persons sharing each item with probability density.
+
+    Every item is given to at least one person so the receipt is fully shared.
+    """
+    persons_items = [
+        [i for i in range(item_count) if rng.random() < density] for _ in range(count)
+    ]
+    shared_items = set().union(*persons_items)
+    for i in range(item_count):
+        if i not in shared_items:
+            persons_items[rng.randrange(count)].append(i)
+
+    return [
+        Person(name=f"Person {p}", items=sorted(items))
+        for p, items in enumerate(persons_items)
+    ]
+
+
+def generate_extras(subtotal: float, rng: Random) -> Items:
+    """
+    Generate a service charge of 10-25% and a tax of 5-12% of the subtotal.
+    """
+    return Items(
+        items=[
+            Item(
+                name="Service charge", price=round(subtotal * rng.uniform(0.1, 0.25), 2)
+            ),
+            Item(name="Tax", price=round(subtotal * rng.uniform(0.05, 0.12), 2)),
+        ]
+    )
+
+
+def generate_receipt(
+    item_count: int, person_count: int, density: float = 0.1, seed: int = 0
+) -> tuple[list[Person], Items, Items]:
+    """
+    Generate persons, items and extras of a synthetic receipt.
+
+    Parameters
+    ----------
+    item_count: int
+        Number of receipt items
+    person_count: int
+        Number of persons splitting the receipt
+    density: float
+        Probability of a person sharing any one item
+    seed: int
+        Seed of the random generator, so the same arguments give the same receipt
+
+    Returns
+    -------
+    tuple[list[Person], Items, Items]
+        The persons, items and extras
+    """
+    rng = Random(seed)
+    items = generate_items(item_count, rng)
+    persons = generate_persons(person_count, item_count, density, rng)
+    extras = generate_extras(items.get_sum(), rng)
+    return persons, items, extras
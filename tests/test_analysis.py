@@ -0,0 +1,49 @@
+from threading import Event
+import asyncio
+from ui import analysis
+import pytest
+
+
+def test_get_result_timeout(monkeypatch, tmp_path):
+    image_file_path = tmp_path / "image_file"
+    called = Event()
+    release = Event()
+
+    def analyze(image_file_path):
+        called.set()
+        release.wait()
+
+    monkeypatch.setattr(analysis, "analyze", analyze)
+    monkeypatch.setattr(analysis, "get_call_timeout", lambda: 0.05)
+    analysis.start(image_file_path)
+    try:
+        called.wait()
+        with pytest.raises(TimeoutError):
+            analysis.get_result(image_file_path)
+    finally:
+        release.set()
+
+    assert analysis.get_result(tmp_path / "other_image_file") is None
+
+
+def test_analyze_concurrently_on_one_loop(monkeypatch, tmp_path):
+    image_file_path = tmp_path / "image_file"
+    image_file_path.write_bytes(b"image")
+    loops = []
+
+    class FakeReceipt:
+        def __init__(self, image_data: bytes):
+            pass
+
+        async def extract_concurrently(self):
+            loops.append(asyncio.get_running_loop())
+            return "receipt data"
+
+    monkeypatch.setattr(analysis, "Receipt", FakeReceipt)
+    monkeypatch.setattr(analysis, "EXTRACTION_MODE", "concurrent")
+
+    assert analysis.analyze(image_file_path) == "receipt data"
+    assert analysis.analyze(image_file_path) == "receipt data"
+    # Both receipts share the loop, and so its client
+    assert loops[0] is loops[1]
+    assert loops[0].is_running()
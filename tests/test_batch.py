@@ -0,0 +1,58 @@
+from bill import inference
+from bill.batch import COMBINED_CSV_FILE, process_receipts
+from bill.inference import ReplayBackend
+from click.testing import CliRunner
+from PIL import Image
+from .utils import TEST_DATA_DIR, EXPECTED_ITEMS
+import csv
+import json
+import pytest
+
+
+@pytest.fixture
+def replay_backend():
+    backend = ReplayBackend.from_file(TEST_DATA_DIR / "20241128_183627.json")
+    inference.set_backend(backend)
+    yield backend
+    inference.set_backend(None)
+
+
+def test_process_receipts(replay_backend, tmp_path):
+    receipts_directory = tmp_path / "receipts"
+    output_directory = tmp_path / "output"
+    receipts_directory.mkdir()
+    for index in range(5):
+        Image.new("RGB", (40, 60), (index, 0, 0)).save(
+            receipts_directory / f"{index}.png"
+        )
+    (receipts_directory / "broken.jpg").write_bytes(b"not an image")
+    (receipts_directory / "notes.txt").write_text("not a receipt")
+
+    runner = CliRunner()
+    result = runner.invoke(
+        process_receipts,
+        [str(receipts_directory), str(output_directory), "--workers", "3"],
+    )
+
+    assert result.exit_code == 1
+    assert "Failed broken.jpg" in result.output
+    assert len(list(output_directory.glob("*.json"))) == 5
+
+    receipt_result = json.loads((output_directory / "0.png.json").read_text())
+    assert len(receipt_result["items"]["items"]) == len(EXPECTED_ITEMS.items)
+
+    with open(output_directory / COMBINED_CSV_FILE, newline="") as csv_file:
+        rows = list(csv.reader(csv_file))
+    assert rows[0] == ["Receipt", "Type", "Name", "Price"]
+    assert len(rows) == 1 + 5 * (len(EXPECTED_ITEMS.items) + 2)
+
+    # Resuming only retries the receipt that failed
+    (receipts_directory / "broken.jpg").unlink()
+    Image.new("RGB", (40, 60)).save(receipts_directory / "broken.png")
+    result = runner.invoke(
+        process_receipts, [str(receipts_directory), str(output_directory)]
+    )
+
+    assert result.exit_code == 0
+    assert "6 receipts, 5 already done" in result.output
+    assert len(list(output_directory.glob("*.json"))) == 6
@@ -0,0 +1,160 @@
+import json
+import os
+import time
+import tracemalloc
+from pathlib import Path
+import pytest
+from bill.calculator import Calculator
+from .synthetic import generate_receipt
+from .utils import benchmark
+
+BASELINE_FILE = Path(__file__).parent / "benchmark_baseline.json"
+
+# Grid of (item count, person count). The full grid runs with BILL_BENCHMARK=full.
+GRID = [(100, 10)]
+FULL_GRID = GRID + [(500, 50), (1000, 100), (2000, 200)]
+
+# Settlement backends to benchmark, numpy is optional
+BACKENDS = ["python", "cents"]
+
+# Allowed slowdown against the baseline before a benchmark fails
+TOLERANCE = float(os.environ.get("BILL_BENCHMARK_TOLERANCE", "3.0"))
+
+# Set BILL_BENCHMARK_UPDATE=1 to store the measurements as the new baseline
+UPDATE_BASELINE = os.environ.get("BILL_BENCHMARK_UPDATE") == "1"
+
+# Absolute slack in seconds, so timer noise on tiny grids does not fail
+SLACK_SECONDS = 0.05
+
+REPEAT = 3
+
+
+def get_person_shares(calculator: Calculator):
+    person = calculator.persons[0]
+    for item in calculator.items.items:
+        calculator.get_person_share(item, person)
+
+
+def get_person_totals(calculator: Calculator):
+    for person in calculator.persons:
+        calculator.get_person_total(person)
+
+
+OPERATIONS = {
+    "get_person_share": get_person_shares,
+    "get_person_total": get_person_totals,
+    "get_shares_csv": Calculator.get_shares_csv,
+    "get_shares_spreadsheet": Calculator.get_shares_spreadsheet,
+}
+
+
+def get_grid():
+    return FULL_GRID if os.environ.get("BILL_BENCHMARK") == "full" else GRID
+
+
+def get_run(operation_name: str, backend: str, item_count: int, person_count: int):
+    """
+    Get a function running an operation, including compiling the calculator.
+    """
+    operation = OPERATIONS[operation_name]
+    persons, items, extras = generate_receipt(item_count, person_count)
+
+    def run():
+        operation(
+            Calculator(persons=persons, items=items, extras=extras, backend=backend)
+        )
+
+    return run
+
+
+def measure_seconds(run) -> float:
+    """
+    Get the fastest of REPEAT runs, in seconds.
+    """
+    seconds = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def measure_peak_bytes(run) -> int:
+    """
+    Get the peak memory allocated during a run, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak_bytes
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    try:
+        baseline = json.loads(BASELINE_FILE.read_text())
+    except FileNotFoundError:
+        baseline = {}
+
+    yield baseline
+
+    if UPDATE_BASELINE:
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=4, sort_keys=True) + "\n")
+
+
+def get_expected(baseline: dict, key: str, field: str):
+    expected = baseline.get(key, {}).get(field)
+    if expected is None:
+        pytest.skip(f"no baseline {field} for {key}")
+    return expected
+
+
+grid = pytest.mark.parametrize(
+    "backend,operation_name,item_count,person_count",
+    [
+        (backend, operation_name, item_count, person_count)
+        for backend in BACKENDS
+        for operation_name in OPERATIONS
+        for item_count, person_count in get_grid()
+    ],
+)
+
+
+@grid
+def test_benchmark_memory(baseline, backend, operation_name, item_count, person_count):
+    run = get_run(operation_name, backend, item_count, person_count)
+    peak_bytes = measure_peak_bytes(run)
+
+    key = f"{operation_name}[{backend}-{item_count}x{person_count}]"
+    print(f"{key}: {peak_bytes} bytes peak")
+
+    if UPDATE_BASELINE:
+        baseline.setdefault(key, {})["peak_bytes"] = peak_bytes
+        return
+
+    expected = get_expected(baseline, key, "peak_bytes")
+    assert (
+        peak_bytes <= expected * TOLERANCE
+    ), f"{key} peaked at {peak_bytes} bytes, baseline {expected} bytes"
+
+
+@benchmark
+@grid
+def test_benchmark_time(baseline, backend, operation_name, item_count, person_count):
+    run = get_run(operation_name, backend, item_count, person_count)
+    seconds = measure_seconds(run)
+
+    key = f"{operation_name}[{backend}-{item_count}x{person_count}]"
+    print(f"{key}: {seconds:.4f}s")
+
+    if UPDATE_BASELINE:
+        baseline.setdefault(key, {})["seconds"] = seconds
+        return
+
+    expected = get_expected(baseline, key, "seconds")
+    assert (
+        seconds <= expected * TOLERANCE + SLACK_SECONDS
+    ), f"{key} took {seconds:.4f}s, baseline {expected:.4f}s"
@@ -0,0 +1,114 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bill.cache import ExtractionCache
+from bill.inference import OpenAIBackend
+from bill.receipts import Receipt, ReceiptData
+from .utils import RECEIPT_DATA, FakeCompletions, create_fake_client
+
+
+def set_last_used(cache: ExtractionCache, key: str, seconds_ago: float):
+    last_used = time.time() - seconds_ago
+    os.utime(cache.get_path(key), (last_used, last_used))
+
+
+def test_key():
+    key = ExtractionCache.get_key(b"image", "o4-mini", "1")
+
+    assert key == ExtractionCache.get_key(b"image", "o4-mini", "1")
+    assert key != ExtractionCache.get_key(b"image", "o4-mini", "2")
+    assert key != ExtractionCache.get_key(b"image", "gpt-4o", "1")
+    assert key != ExtractionCache.get_key(b"other image", "o4-mini", "1")
+
+
+def test_get_put(tmp_path):
+    cache = ExtractionCache(tmp_path / "cache")
+
+    assert cache.get("a") is None
+    cache.put("a", '"value"')
+    assert cache.get("a") == '"value"'
+
+
+def test_max_age(tmp_path):
+    cache = ExtractionCache(tmp_path, max_age=60)
+    cache.put("a", '"value"')
+    set_last_used(cache, "a", 120)
+
+    assert cache.get("a") is None
+    assert not cache.get_path("a").exists()
+
+
+def test_least_recently_used(tmp_path):
+    cache = ExtractionCache(tmp_path, max_bytes=10)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    set_last_used(cache, "a", 20)
+    set_last_used(cache, "b", 10)
+    assert cache.get("a") == "12345"
+
+    cache.put("c", "12345")
+
+    assert cache.get("a") == "12345"
+    assert cache.get("b") is None
+    assert cache.get("c") == "12345"
+
+
+def test_receipt_cache(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    completions = FakeCompletions()
+
+    for _ in range(2):
+        receipt = Receipt(
+            b"png", cache=cache, backend=OpenAIBackend(create_fake_client(completions))
+        )
+        assert receipt.extract() == RECEIPT_DATA
+    assert len(completions.calls) == 1
+
+    receipt = Receipt(
+        b"png", cache=cache, backend=OpenAIBackend(create_fake_client(completions))
+    )
+    receipt.extract(use_cache=False)
+    assert len(completions.calls) == 2
+
+    receipt = Receipt(
+        b"other png",
+        cache=cache,
+        backend=OpenAIBackend(create_fake_client(completions)),
+    )
+    assert isinstance(receipt.extract(), ReceiptData)
+    assert len(completions.calls) == 3
+
+
+def test_concurrent_put(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    values = [f'"{"x" * 100_000}{i}"' for i in range(16)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda value: cache.put("a", value), values))
+
+    assert cache.get("a") in values
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unreadable_entry(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    cache.get_path("a").write_text('{"items": [')
+    cache.get_path("b").write_bytes(b"\xff\xfe")
+
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert not cache.get_path("a").exists()
+    assert not cache.get_path("b").exists()
+
+
+def test_receipt_cache_invalid_entry(tmp_path):
+    cache = ExtractionCache(tmp_path)
+    completions = FakeCompletions()
+    receipt = Receipt(
+        b"png", cache=cache, backend=OpenAIBackend(create_fake_client(completions))
+    )
+    cache.put(receipt.get_cache_key(), '{"items": []}')
+
+    assert receipt.extract() == RECEIPT_DATA
+    assert len(completions.calls) == 1
+    assert ReceiptData.model_validate_json(cache.get(receipt.get_cache_key()))
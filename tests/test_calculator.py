@@ -1,6 +1,9 @@
+import csv
+import random
+from io import StringIO
 import pytest
 from bill.calculator import Calculator
-from bill.person import Person
+from bill.person import ItemSet, Person
 from bill.receipts import Item, Items
 from tests.utils import EXPECTED_ITEMS
 from openpyxl import load_workbook
@@ -52,8 +55,8 @@ def sample_persons():
     return [person_a, person_b, person_c]
 
 
-@pytest.fixture
-def calculator(sample_persons):
+@pytest.fixture(params=["python", "numpy"])
+def calculator(request, sample_persons):
     """
     Create a Calculator object with the sample persons, items from utils, and extra items for service charge and tax.
 
@@ -69,7 +72,15 @@ def calculator(sample_persons):
     tax = Item(name=TAX, price=subtotal * 0.1035)
     extras = Items(items=[service_charge, tax])
 
-    return Calculator(persons=sample_persons, items=EXPECTED_ITEMS, extras=extras)
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+
+    return Calculator(
+        persons=sample_persons,
+        items=EXPECTED_ITEMS,
+        extras=extras,
+        backend=request.param,
+    )
 
 
 @pytest.mark.parametrize(
@@ -314,3 +325,153 @@ def test_spreadsheet(calculator, sample_persons):
     assert worksheet[f"D{total_row}"].value == f"=SUM(D{subtotal_row}:D{tax_row})"
     assert worksheet[f"E{total_row}"].value == f"=SUM(E{subtotal_row}:E{tax_row})"
     assert worksheet[f"F{total_row}"].value == f"=SUM(C{total_row}:E{total_row})"
+
+
+def test_settlement(calculator, sample_persons):
+    settlement = calculator.settlement
+
+    assert settlement.get_split_count(0) == 2
+    assert settlement.get_split_count(14) == 3
+    assert settlement.is_sharing(15, 1)
+    assert not settlement.is_sharing(15, 2)
+    assert settlement.receipt_subtotal == EXPECTED_ITEMS.get_sum()
+    assert settlement.subtotals == pytest.approx([76.50, 91.00, 153.50])
+    assert sum(settlement.ratios) == pytest.approx(1.0)
+
+    person_copy = sample_persons[0].model_copy()
+    assert calculator.get_person_subtotal(person_copy) == pytest.approx(76.50)
+
+
+def test_vector_backend_matches_python():
+    pytest.importorskip("numpy")
+    rng = random.Random(7)
+
+    items = Items(
+        items=[
+            Item(name=f"Item {i}", price=rng.randint(100, 5000) / 100)
+            for i in range(300)
+        ]
+    )
+    extras = Items(
+        items=[Item(name=SERVICE_CHARGE, price=80.0), Item(name=TAX, price=41.4)]
+    )
+    persons = [
+        Person(name=f"P{p}", items=[i for i in range(300) if rng.random() < 0.1])
+        for p in range(40)
+    ]
+
+    python = Calculator(persons=persons, items=items, extras=extras)
+    vector = Calculator(persons=persons, items=items, extras=extras, backend="numpy")
+
+    for person in persons:
+        assert vector.get_person_subtotal(person) == pytest.approx(
+            python.get_person_subtotal(person)
+        )
+        assert vector.get_person_total(person) == pytest.approx(
+            python.get_person_total(person)
+        )
+        for (_, vector_share), (_, python_share) in zip(
+            vector.get_person_shares(person), python.get_person_shares(person)
+        ):
+            assert vector_share == pytest.approx(python_share)
+
+    vector_rows = list(csv.reader(StringIO(vector.get_shares_csv())))
+    python_rows = list(csv.reader(StringIO(python.get_shares_csv())))
+    assert vector_rows[0] == python_rows[0]
+    for vector_row, python_row in zip(vector_rows[1:], python_rows[1:]):
+        assert vector_row[:2] == python_row[:2]
+        for vector_cell, python_cell in zip(vector_row[2:], python_row[2:]):
+            assert float(vector_cell or 0) == pytest.approx(
+                float(python_cell or 0), abs=0.01
+            )
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Calculator(
+            persons=[], items=Items(items=[]), extras=Items(items=[]), backend=""
+        )
+
+
+@pytest.mark.parametrize("person_index,item_index", [(0, 1), (0, 0), (2, 15), (1, 14)])
+def test_update_item(calculator, person_index, item_index):
+    persons = calculator.persons
+    items = calculator.items
+    extras = calculator.extras
+
+    changes = calculator.update_item(person_index, item_index)
+    expected = Calculator(persons=persons, items=items, extras=extras)
+
+    assert person_index in [change.person_index for change in changes]
+    for change in changes:
+        person = persons[change.person_index]
+        assert change.share == expected.get_person_share(
+            items.items[item_index], person
+        )
+        assert change.subtotal == pytest.approx(expected.get_person_subtotal(person))
+        assert change.total == pytest.approx(expected.get_person_total(person))
+        assert change.extras == pytest.approx(
+            [expected.get_person_extra(extra, person) for extra in extras.items]
+        )
+
+    for person in persons:
+        assert calculator.get_person_total(person) == pytest.approx(
+            expected.get_person_total(person)
+        )
+
+
+def test_csv_stream(calculator):
+    lines = list(calculator.iter_shares_csv())
+
+    assert len(lines) == 1 + len(EXPECTED_ITEMS.items) + 1 + 2 + 1
+    assert all(line.endswith("\r\n") and line.count("\r\n") == 1 for line in lines)
+    assert "".join(lines) == calculator.get_shares_csv()
+
+
+def test_csv_duplicate_names():
+    persons = [Person(name="A", items=[0]), Person(name="A", items=[0, 1])]
+    calculator = Calculator(persons, EXPECTED_ITEMS, Items(items=[]))
+
+    lines = calculator.get_shares_csv().splitlines()
+    assert lines[0] == "Item,Receipt,A,A,Check"
+    assert lines[1] == "GL-Domaine Amido Cotes Du Rhone,13.00,6.50,6.50,"
+
+
+def test_spreadsheet_many_persons():
+    persons = [Person(name=f"P{i}", items=[0]) for i in range(30)]
+    calculator = Calculator(persons, EXPECTED_ITEMS, Items(items=[]))
+
+    workbook = load_workbook(calculator.get_shares_spreadsheet())
+    worksheet = workbook.active
+
+    assert worksheet.title == "Bill Split"
+    assert worksheet["AF1"].value == "P29"
+    assert worksheet["AG1"].value == "Check"
+    assert worksheet["AF2"].value == "=$B2/30"
+    assert worksheet["AF18"].value == "=SUM(AF2:AF17)"
+    assert worksheet["AG18"].value == "=SUM(C18:AF18)"
+
+
+def test_person_items_set():
+    person = Person.model_validate_json('{"name": "Test", "items": [5, 1, 3, 3]}')
+
+    assert person.items == [1, 3, 5]
+    assert 3 in person.items and 4 not in person.items and -1 not in person.items
+    assert len(person.items) == 3
+    assert person.model_dump() == {"name": "Test", "items": [1, 3, 5]}
+    assert person.model_dump_json() == '{"name":"Test","items":[1,3,5]}'
+
+    other = Person(name="Other", items=[3, 200])
+    assert person.items & other.items == [3]
+    assert ItemSet.union(person.items, other.items) == [1, 3, 5, 200]
+    assert person.items - other.items == {1, 5}
+
+    person.items = [7]
+    assert isinstance(person.items, ItemSet)
+    assert 7 in person.items
+    assert 10**9 not in person.items
+
+    with pytest.raises(ValueError):
+        person.update_item(10**9)
+    with pytest.raises(ValueError):
+        person.update_item(-1)
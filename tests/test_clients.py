@@ -0,0 +1,39 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from bill import clients
+
+
+def test_shared_client():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        client_ids = set(executor.map(lambda _: id(clients.get_client()), range(32)))
+
+    assert len(client_ids) == 1
+
+
+def test_configure():
+    client = clients.get_client()
+
+    clients.configure(max_connections=5, timeout=30, connect_timeout=3, max_retries=4)
+    try:
+        configured_client = clients.get_client()
+
+        assert configured_client is not client
+        assert configured_client.max_retries == 4
+        assert configured_client.timeout.read == 30
+        assert configured_client.timeout.connect == 3
+        assert clients.get_call_timeout() == 150
+    finally:
+        clients.configure(
+            max_connections=20, timeout=120, connect_timeout=10, max_retries=2
+        )
+
+
+def test_async_client_per_loop():
+    async def get_clients():
+        return clients.get_async_client(), clients.get_async_client()
+
+    first, same = asyncio.run(get_clients())
+    second, _ = asyncio.run(get_clients())
+
+    assert first is same
+    assert first is not second
@@ -1,5 +1,15 @@
-from bill.images import load_image
-from PIL import Image
+from bill.images import (
+    choose_encoding,
+    compress,
+    get_draft_size,
+    get_mime_type,
+    get_receipt_side,
+    get_skew_angle,
+    load_image,
+    preprocess,
+)
+from bill.receipts import Receipt
+from PIL import Image, ImageDraw
 from .utils import TEST_DATA_DIR
 import os
 import pytest
@@ -23,3 +33,135 @@ def test_load_image(image_file_name):
     image_file_path = TEST_DATA_DIR / image_file_name
     image_data = load_image(image_file_path)
     assert len(image_data) <= 1024 * 1024 * 5
+
+    # A photo is encoded lossy, and the data URL sent to the model says so
+    mime_type = get_mime_type(image_data)
+    assert mime_type in ("image/jpeg", "image/webp")
+    assert Receipt(image_data).image_url.startswith(f"data:{mime_type};base64,")
+
+
+@pytest.mark.parametrize("max_data_size", [1024 * 1024, 200 * 1024])
+def test_compress_encode_count(max_data_size):
+    image = Image.frombytes("RGB", (1200, 900), os.urandom(1200 * 900 * 3))
+    compressed_image = compress(image, max_data_size)
+
+    assert len(compressed_image.data) <= max_data_size
+    assert compressed_image.encode_count <= 3
+    # Close to the budget rather than far below it
+    assert len(compressed_image.data) > max_data_size * 0.7
+
+
+def test_compress_small_image():
+    compressed_image = compress(Image.new("RGB", (400, 300)), 1024 * 1024)
+    assert compressed_image.encode_count == 1
+    assert compressed_image.image.size == (400, 300)
+
+
+def test_choose_encoding():
+    image = Image.open(TEST_DATA_DIR / "20241128_183627.jpg").convert("RGB")
+    image.thumbnail((800, 800))
+
+    assert choose_encoding(image, ["PNG"]) == ("PNG", None)
+    format, quality = choose_encoding(image, ["JPEG", "WEBP"], min_psnr=38)
+    assert format in ("JPEG", "WEBP") and quality is not None
+    # A floor no lossy quality can keep falls back to PNG
+    assert choose_encoding(image, ["JPEG"], min_psnr=90) == ("PNG", None)
+
+
+@pytest.mark.parametrize("format", ["PNG", "JPEG", "WEBP"])
+def test_compress_format(format):
+    image = Image.frombytes("RGB", (800, 600), os.urandom(800 * 600 * 3))
+    compressed_image = compress(
+        image, 200 * 1024, format, None if format == "PNG" else 80
+    )
+
+    assert len(compressed_image.data) <= 200 * 1024
+    assert get_mime_type(compressed_image.data) == compressed_image.mime_type
+
+
+def create_receipt_photo(angle: float) -> Image.Image:
+    """
+    Draw a receipt with lines of text on a dark table, rotated by angle.
+    """
+    receipt = Image.new("L", (600, 1200), 240)
+    draw = ImageDraw.Draw(receipt)
+    for y in range(60, 1140, 40):
+        draw.rectangle((40, y, 560, y + 12), fill=20)
+
+    photo = Image.new("L", (1600, 1600), 60)
+    photo.paste(receipt.rotate(angle, expand=True, fillcolor=60), (400, 150))
+    return photo.convert("RGB")
+
+
+@pytest.mark.parametrize("angle", [-3, 0, 2.5])
+def test_get_skew_angle(angle):
+    photo = create_receipt_photo(angle).convert("L")
+    assert get_skew_angle(photo) == -angle
+
+
+def test_get_skew_angle_without_text():
+    assert get_skew_angle(Image.new("L", (400, 600), 240)) == 0
+    assert get_skew_angle(Image.effect_noise((400, 600), 64)) == 0
+
+
+def test_preprocess():
+    image = preprocess(create_receipt_photo(2), max_side=1000)
+
+    assert image.mode == "L"
+    assert max(image.size) <= 1000
+    # Cropped to the receipt, which is taller than wide
+    assert image.height > image.width * 1.5
+
+
+def test_preprocess_exif_orientation(tmp_path):
+    image_file_path = tmp_path / "rotated.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90 degrees clockwise
+    create_receipt_photo(0).save(image_file_path, exif=exif)
+
+    # The tall receipt lies on its side once the orientation is applied
+    image = preprocess(Image.open(image_file_path))
+    assert image.width > image.height * 1.5
+
+
+def test_draft_decoding(tmp_path):
+    image_file_path = tmp_path / "photo.jpg"
+    create_receipt_photo(0).resize((4000, 4000)).save(image_file_path)
+
+    image = Image.open(image_file_path)
+    image.draft("L", get_draft_size(image, 500))
+    assert image.size == (2000, 2000)
+    assert image.mode == "L"
+
+    receipt = preprocess(Image.open(image_file_path), max_side=1000)
+    assert max(receipt.size) <= 1000
+
+
+def test_draft_decoding_small_receipt(tmp_path):
+    image_file_path = tmp_path / "photo.jpg"
+    photo = Image.new("L", (4000, 3000), 60)
+    receipt = create_receipt_photo(0).convert("L").crop((400, 150, 1000, 1350))
+    photo.paste(receipt.resize((1100, 2200)), (1400, 400))
+    photo.save(image_file_path)
+
+    # The receipt keeps its resolution although it covers a fifth of the photo
+    receipt = preprocess(Image.open(image_file_path), max_side=2048)
+    assert max(receipt.size) >= 2048 * 0.95
+
+
+def test_draft_decoding_receipt_side(tmp_path):
+    image_file_path = tmp_path / "photo.jpg"
+    create_receipt_photo(0).resize((4000, 4000)).save(image_file_path)
+
+    # The receipt is 3000 pixels tall, so a quarter scale still keeps 500 for it
+    receipt_side = get_receipt_side(Image.open(image_file_path))
+    assert receipt_side == pytest.approx(3000, rel=0.05)
+
+    image = Image.open(image_file_path)
+    image.draft("L", get_draft_size(image, 500, receipt_side))
+    assert image.size == (1000, 1000)
+
+    receipt = preprocess(
+        Image.open(image_file_path), max_side=500, receipt_side=receipt_side
+    )
+    assert max(receipt.size) >= 500 * 0.95
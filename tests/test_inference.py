@@ -0,0 +1,77 @@
+from bill import inference
+from bill.inference import InferenceBackend, ReplayBackend, create_backend
+from bill.receipts import Receipt, ReceiptData
+from .utils import TEST_DATA_DIR, RECEIPT_DATA, EXPECTED_ITEMS
+import asyncio
+import pytest
+
+RECORDING_FILE = TEST_DATA_DIR / "20241128_183627.json"
+
+
+def test_replay_backend():
+    receipt = Receipt(b"png", backend=ReplayBackend.from_file(RECORDING_FILE))
+
+    assert receipt.extract() == RECEIPT_DATA
+    assert (
+        asyncio.run(Receipt(b"png", backend=receipt.backend).extract_concurrently())
+        == RECEIPT_DATA
+    )
+    assert (
+        list(Receipt(b"png", backend=receipt.backend).stream_items())
+        == EXPECTED_ITEMS.items
+    )
+
+
+def test_replay_backend_latency(monkeypatch):
+    events = []
+    sleep_async = asyncio.sleep
+
+    async def record_sleep_async(seconds):
+        events.append(("sleep", seconds))
+        await sleep_async(0)
+        events.append(("wake", seconds))
+
+    monkeypatch.setattr(inference.asyncio, "sleep", record_sleep_async)
+    monkeypatch.setattr(inference.time, "sleep", lambda seconds: events.append(seconds))
+    backend = ReplayBackend.from_file(RECORDING_FILE, latency=0.2)
+
+    asyncio.run(Receipt(b"png", backend=backend).extract_concurrently())
+    # Each of the four questions waits the latency, all at once
+    assert events == [("sleep", 0.2)] * 4 + [("wake", 0.2)] * 4
+
+    events.clear()
+    streamed_items = Receipt(b"png", backend=backend).stream_items()
+    next(streamed_items)
+    # The first item is complete once the second begins
+    assert len(events) == 2
+    list(streamed_items)
+    # The latency is spread over the items and the final answer
+    assert len(events) == len(EXPECTED_ITEMS.items) + 1
+    assert sum(events) == pytest.approx(0.2)
+
+
+def test_backend_from_environment(monkeypatch):
+    monkeypatch.setenv(inference.INFERENCE_BACKEND, "replay")
+    monkeypatch.setenv(inference.INFERENCE_REPLAY_FILE, str(RECORDING_FILE))
+    inference.set_backend(None)
+    try:
+        backend = inference.get_backend()
+        assert isinstance(backend, ReplayBackend)
+        assert inference.get_backend() is backend
+        assert isinstance(Receipt(b"png").extract(), ReceiptData)
+    finally:
+        inference.set_backend(None)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown inference backend"):
+        create_backend("telepathy")
+
+
+def test_incomplete_backend():
+    class ParseOnlyBackend(InferenceBackend):
+        def parse(self, model, messages, response_format, call=None):
+            return None
+
+    with pytest.raises(TypeError, match="stream"):
+        ParseOnlyBackend()
@@ -0,0 +1,37 @@
+from bill.images import get_mime_type
+from threading import BoundedSemaphore
+from ui import ingestion
+from .utils import TEST_DATA_DIR
+import os
+import pytest
+
+
+def test_load():
+    image_data = (TEST_DATA_DIR / "20241128_183627.jpg").read_bytes()
+    receipt_image_data = ingestion.load(image_data)
+
+    assert get_mime_type(receipt_image_data) in ("image/jpeg", "image/webp")
+    assert len(receipt_image_data) < len(image_data)
+
+
+def test_load_when_queue_full(monkeypatch):
+    monkeypatch.setattr(ingestion, "_queue_slots", BoundedSemaphore(1))
+    ingestion._queue_slots.acquire()
+
+    with pytest.raises(ingestion.IngestionBusy):
+        ingestion.load(b"image")
+
+
+def exit_worker(image_data: bytes) -> bytes:
+    os._exit(1)
+
+
+def test_load_when_worker_dies(monkeypatch):
+    monkeypatch.setattr(ingestion, "load_image_data", exit_worker)
+    with pytest.raises(ingestion.IngestionFailed):
+        ingestion.load(b"image")
+    monkeypatch.undo()
+
+    # A new pool replaces the broken one
+    image_data = (TEST_DATA_DIR / "20241128_183627.jpg").read_bytes()
+    assert get_mime_type(ingestion.load(image_data)) in ("image/jpeg", "image/webp")
@@ -1,5 +1,8 @@
 from copy import deepcopy
 import pytest
+from bill.calculator import Calculator
+from bill.person import Person
+from bill.receipts import Item, Items
 from .utils import EXPECTED_ITEMS
 
 
@@ -33,3 +36,70 @@ def test_items_split(index: int, split_item_price: float | None):
     prices = sorted([item.price for item in new_items])
     expected_prices = sorted([split_item_price, original_item.price - split_item_price])
     assert prices == expected_prices
+
+
+def test_item_ids():
+    items = Items.model_validate_json(EXPECTED_ITEMS.model_dump_json())
+
+    ids = [item.id for item in items.items]
+    assert len(set(ids)) == len(ids)
+    assert ids == [item.id for item in EXPECTED_ITEMS.items]
+    assert '"id"' not in items.items[0].model_dump_json()
+    assert "ids" not in Items.model_json_schema()["properties"]
+
+    for position, item in enumerate(items.items):
+        assert items.index_of(item) == position
+
+    # Saved and loaded again, as between requests of a session
+    loaded_items = Items.model_validate_json(items.model_dump_json())
+    assert [item.id for item in loaded_items.items] == ids
+
+
+def test_copied_item_ids():
+    items = Items.model_validate_json(EXPECTED_ITEMS.model_dump_json())
+    original_item = items.items[3]
+    original_id = original_item.id
+
+    copied_item = original_item.model_copy()
+    assert copied_item.id != original_id
+
+    # A shared id stays with the item indexed under it, wherever the other one is
+    copied_item._id = original_id
+    items.index_of(original_item)
+    items.items.insert(0, copied_item)
+    assert items.index_of(copied_item) == 0
+    assert items.index_of(original_item) == 4
+    assert original_item.id == original_id
+    assert copied_item.id != original_id
+
+
+def test_duplicate_items():
+    items = Items(items=[Item(name="Beer", price=8.0), Item(name="Beer", price=8.0)])
+    beer, other_beer = items.items
+
+    assert beer == other_beer
+    assert items.index_of(beer) == 0
+    assert items.index_of(other_beer) == 1
+
+    persons = [Person(name="A", items=[0]), Person(name="B", items=[1])]
+    calculator = Calculator(persons, items, Items(items=[]))
+    assert calculator.get_person_share(other_beer, persons[0]) == 0.0
+    assert calculator.get_person_share(other_beer, persons[1]) == 8.0
+
+
+def test_items_index_after_changes():
+    items = deepcopy(EXPECTED_ITEMS)
+    original_item = items.items[15]
+
+    items.split(0)
+    assert items.index_of(original_item) == 16
+    assert items.index_of(items.items[1]) == 1
+
+    new_item = Item(name="Naan", price=4.0)
+    items.append(new_item)
+    assert items.index_of(new_item) == 17
+
+    copied_item = deepcopy(new_item)
+    items.items.insert(0, copied_item)
+    assert items.index_of(copied_item) == 0
+    assert items.index_of(new_item) == 18
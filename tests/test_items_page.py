@@ -0,0 +1,34 @@
+from pathlib import Path
+import pytest
+
+UI_DIR = Path(__file__).parent / ".." / "src" / "ui"
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    # The ui modules import each other as top-level modules
+    monkeypatch.syspath_prepend(str(UI_DIR))
+    monkeypatch.setenv("FLASK_SECRET_KEY", "test")
+    from app import app
+    import session_data
+
+    with app.test_client() as client:
+        with client.session_transaction() as session:
+            session[session_data.DATA_DIRECTORY] = str(tmp_path)
+        yield client
+
+
+def test_add_items_after_failed_stream(client):
+    # No receipt image was saved, so extracting the items fails
+    response = client.get("/items/stream")
+    assert "event: failed" in response.get_data(as_text=True)
+
+    response = client.post("/add_item", json={"name": "Chilli Gobhi", "price": 12.0})
+    assert response.status_code == 200
+
+    response = client.post("/prepare_split")
+    assert response.status_code == 200
+    assert response.get_json()["item_count"] == 1
+
+    response = client.get("/extras")
+    assert response.status_code == 200
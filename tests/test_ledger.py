@@ -0,0 +1,82 @@
+import random
+import time
+import pytest
+from bill.ledger import Ledger, LedgerReceipt
+from bill.money import to_cents
+from bill.person import Person
+from bill.receipts import Item, Items
+from .utils import benchmark
+
+
+def create_receipt(payer: str, shares: dict[str, list[int]], prices: list[float]):
+    return LedgerReceipt(
+        payer=payer,
+        persons=[Person(name=name, items=items) for name, items in shares.items()],
+        items=Items(
+            items=[Item(name=f"Item {i}", price=p) for i, p in enumerate(prices)]
+        ),
+        extras=Items(items=[]),
+    )
+
+
+def test_balances():
+    ledger = Ledger(
+        [
+            create_receipt("A", {"A": [0], "B": [0, 1], "C": [1]}, [30.0, 10.0]),
+            create_receipt("B", {"B": [0], "C": [0]}, [20.0]),
+        ]
+    )
+
+    assert ledger.get_balances() == pytest.approx({"A": 25.0, "B": -10.0, "C": -15.0})
+
+
+def test_settle():
+    ledger = Ledger(
+        [
+            create_receipt("A", {"A": [0], "B": [0], "C": [0], "D": [0]}, [100.0]),
+            create_receipt("D", {"C": [0], "D": [0]}, [20.0]),
+        ]
+    )
+
+    transfers = ledger.settle()
+
+    assert len(transfers) == 3
+    assert [(t.debtor, t.creditor, t.amount) for t in transfers] == [
+        ("C", "A", 35.0),
+        ("B", "A", 25.0),
+        ("D", "A", 15.0),
+    ]
+
+
+def create_large_ledger() -> Ledger:
+    rng = random.Random(5)
+    names = [f"P{i}" for i in range(300)]
+    receipts = []
+    for _ in range(300):
+        group = rng.sample(names, 12)
+        prices = [rng.randint(100, 9000) / 100 for _ in range(20)]
+        shares = {name: [i for i in range(20) if rng.random() < 0.3] for name in group}
+        shares[group[0]] = list(range(20))
+        receipts.append(create_receipt(rng.choice(group), shares, prices))
+    return Ledger(receipts)
+
+
+def test_settle_large():
+    ledger = create_large_ledger()
+    transfers = ledger.settle()
+
+    assert sum(ledger.balances.values()) == 0
+    assert len(transfers) < len(ledger.balances)
+
+    settled = dict(ledger.balances)
+    for transfer in transfers:
+        settled[transfer.debtor] += to_cents(transfer.amount)
+        settled[transfer.creditor] -= to_cents(transfer.amount)
+    assert not any(settled.values())
+
+
+@benchmark
+def test_settle_large_time():
+    start = time.perf_counter()
+    create_large_ledger().settle()
+    assert time.perf_counter() - start < 1.0
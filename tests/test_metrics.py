@@ -0,0 +1,86 @@
+from bill.inference import OpenAIBackend
+from bill.metrics import Histogram, InferenceMetrics, inference_metrics
+from bill.receipts import Receipt
+from .utils import FakeAsyncCompletions, FakeCompletions, create_fake_client
+import asyncio
+import pytest
+import time
+
+
+def test_histogram():
+    histogram = Histogram((1, 10, float("inf")))
+    for value in (0.5, 1, 2, 50):
+        histogram.observe(value)
+
+    assert histogram.get_cumulative_counts() == [2, 3, 4]
+    assert histogram.sum == 53.5
+    assert histogram.count == 4
+
+
+def test_measure_failure():
+    metrics = InferenceMetrics()
+    with pytest.raises(TimeoutError):
+        with metrics.measure("tax", 1000):
+            raise TimeoutError()
+
+    rendered = metrics.render()
+    assert 'inference_failures_total{question="tax"} 1' in rendered
+    assert 'inference_wall_time_seconds_count{question="tax"} 1' in rendered
+
+
+def test_measure_stream(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(time, "perf_counter", lambda: clock[0])
+    closed = []
+
+    def open_stream(call):
+        try:
+            for entry in ("first", "second"):
+                clock[0] += 1
+                yield entry
+        finally:
+            closed.append(True)
+
+    metrics = InferenceMetrics()
+    for _ in metrics.measure_stream("extraction", 1000, open_stream):
+        # Time the consumer takes, such as writing an event to the client
+        clock[0] += 10
+
+    # The client disconnects after the first entry
+    entries = metrics.measure_stream("extraction", 1000, open_stream)
+    next(entries)
+    entries.close()
+
+    assert closed == [True, True]
+    assert metrics.histograms[("wall_time_seconds", "extraction")].sum == 3
+    assert metrics.histograms[("wall_time_seconds", "extraction")].count == 2
+    assert not metrics.failures
+
+
+def test_receipt_inference_metrics():
+    inference_metrics.reset()
+    backend = OpenAIBackend(
+        create_fake_client(FakeCompletions()),
+        create_fake_client(FakeAsyncCompletions()),
+    )
+    receipt = Receipt(b"png" * 1000, backend=backend)
+
+    receipt.extract(use_cache=False)
+    asyncio.run(Receipt(b"png" * 1000, backend=backend).extract_concurrently(False))
+
+    histograms = inference_metrics.histograms
+    assert {question for _, question in histograms} == {
+        "extraction",
+        "items",
+        "subtotal",
+        "service_charge",
+        "tax",
+    }
+    assert histograms["prompt_tokens", "extraction"].sum == 1200
+    assert histograms["cached_tokens", "extraction"].sum == 1024
+    assert histograms["payload_bytes", "tax"].sum == len(receipt.image_url)
+
+    rendered = inference_metrics.render()
+    assert "# TYPE inference_completion_tokens histogram" in rendered
+    assert 'inference_completion_tokens_bucket{question="items",le="500"} 1' in rendered
+    assert 'inference_payload_bytes_count{question="extraction"} 1' in rendered
@@ -0,0 +1,116 @@
+import csv
+import random
+from io import StringIO
+import pytest
+from bill.calculator import Calculator
+from bill.money import allocate, to_cents
+from bill.person import Person
+from bill.receipts import Item, Items
+from tests.utils import EXPECTED_ITEMS
+
+
+@pytest.mark.parametrize(
+    "amount,weights,expected",
+    [
+        (100, [1, 1, 1], [34, 33, 33]),
+        (3322, [7650, 9100, 15350], [792, 942, 1588]),
+        (5, [0, 0], [3, 2]),
+        (5, [], []),
+        (-5, [1, 1], [-2, -3]),
+        (7, [2, 0, 1], [5, 0, 2]),
+    ],
+)
+def test_allocate(amount, weights, expected):
+    shares = allocate(amount, weights)
+    assert list(shares) == expected
+
+
+def test_to_cents():
+    assert to_cents(33.2235) == 3322
+    assert to_cents(0.1 + 0.2) == 30
+
+
+def get_csv_rows(calculator: Calculator) -> list[list[str]]:
+    return list(csv.reader(StringIO(calculator.get_shares_csv())))[1:]
+
+
+def test_cents_columns_add_up():
+    rng = random.Random(11)
+    items = Items(
+        items=[
+            Item(name=f"Item {i}", price=rng.randint(1, 9999) / 100) for i in range(200)
+        ]
+    )
+    extras = Items(
+        items=[Item(name="Service charge", price=71.33), Item(name="Tax", price=29.07)]
+    )
+    persons = [
+        Person(name=f"P{p}", items=[i for i in range(200) if rng.random() < 0.2])
+        for p in range(13)
+    ]
+    persons[0].items = list(range(200))
+
+    calculator = Calculator(
+        persons=persons, items=items, extras=extras, backend="cents"
+    )
+
+    for row in get_csv_rows(calculator):
+        receipt = to_cents(float(row[1]))
+        person_cents = sum(to_cents(float(cell or 0)) for cell in row[2:-1])
+        assert person_cents == receipt, row[0]
+
+    total = sum(calculator.get_person_total(person) for person in persons)
+    assert to_cents(total) == to_cents(items.get_sum() + extras.get_sum())
+
+
+def test_cents_matches_float():
+    persons = [
+        Person(name="A", items=[0, 2, 4, 6, 8, 10, 12, 14, 15]),
+        Person(name="B", items=[1, 3, 5, 7, 9, 11, 13, 14, 15]),
+    ]
+    extras = Items(items=[Item(name="Tax", price=20.0)])
+    cents = Calculator(persons, EXPECTED_ITEMS, extras, backend="cents")
+    python = Calculator(persons, EXPECTED_ITEMS, extras)
+
+    for person in persons:
+        assert cents.get_person_total(person) == pytest.approx(
+            python.get_person_total(person), abs=0.01
+        )
+
+
+def test_cents_update_item():
+    persons = [Person(name="A", items=[0, 1]), Person(name="B", items=[1])]
+    items = Items(items=[Item(name="X", price=10.0), Item(name="Y", price=0.05)])
+    extras = Items(items=[Item(name="Tax", price=1.01)])
+    calculator = Calculator(persons, items, extras, backend="cents")
+
+    changes = calculator.update_item(1, 0)
+    expected = Calculator(persons, items, extras, backend="cents")
+
+    assert [change.person_index for change in changes] == [0, 1]
+    for change in changes:
+        person = persons[change.person_index]
+        assert change.share == expected.get_person_share(items.items[0], person)
+        assert change.total == expected.get_person_total(person)
+    assert to_cents(sum(change.total for change in changes)) == 1106
+
+
+def test_cents_leftover_rotates():
+    persons = [Person(name=name, items=range(30)) for name in "ABC"]
+    items = Items(items=[Item(name=f"Item {i}", price=1.0) for i in range(30)])
+    calculator = Calculator(persons, items, Items(items=[]), backend="cents")
+
+    # 100 cents split 3 ways leaves a cent on every item, spread over the sharers
+    assert [calculator.get_person_subtotal(person) for person in persons] == [
+        10.0,
+        10.0,
+        10.0,
+    ]
+
+
+def test_cents_extras_without_subtotals():
+    persons = [Person(name="A", items=[]), Person(name="B", items=[])]
+    extras = Items(items=[Item(name="Tip", price=5.01)])
+    calculator = Calculator(persons, Items(items=[]), extras, backend="cents")
+
+    assert [calculator.get_person_total(person) for person in persons] == [2.51, 2.5]
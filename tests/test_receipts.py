@@ -1,6 +1,93 @@
-from bill.receipts import Receipt
+from bill.inference import OpenAIBackend
+from bill.receipts import Receipt, ReceiptData
 from bill.images import load_image
-from .utils import TEST_DATA_DIR
+from .utils import (
+    TEST_DATA_DIR,
+    EXPECTED_ITEMS,
+    RECEIPT_DATA,
+    FakeAsyncCompletions,
+    FakeCompletions,
+    FakeStreamingCompletions,
+    create_fake_client,
+)
+import asyncio
+import json
+
+
+def test_receipt_single_extraction():
+    completions = FakeCompletions()
+    receipt = Receipt(b"png", backend=OpenAIBackend(create_fake_client(completions)))
+
+    messages = receipt.start_analysis()
+    items, messages = receipt.get_items_with_chat(messages)
+    subtotal, messages = receipt.get_subtotal_with_chat(messages)
+    service_charge, messages = receipt.get_service_charge_with_chat(messages)
+    tax, messages = receipt.get_tax_with_chat(messages)
+
+    assert len(completions.calls) == 1
+    assert completions.calls[0]["response_format"] is ReceiptData
+    assert items.items == EXPECTED_ITEMS.items
+    assert subtotal.price == 321.0
+    assert (service_charge.name, service_charge.price) == ("Service charge", 64.2)
+    assert (tax.name, tax.price) == ("Tax", 33.22)
+    assert receipt.extract().get_extras().get_sum() == 64.2 + 33.22
+
+
+def test_receipt_concurrent_extraction():
+    completions = FakeAsyncCompletions(delay=0.01)
+    receipt = Receipt(
+        b"png", backend=OpenAIBackend(async_client=create_fake_client(completions))
+    )
+
+    receipt_data = asyncio.run(receipt.extract_concurrently())
+
+    assert receipt_data == RECEIPT_DATA
+    assert len(completions.calls) == 4
+    # Every question is asked before any answer arrives
+    assert completions.events == ["start"] * 4 + ["end"] * 4
+    assert all(
+        call["messages"][-1]["content"][1]["type"] == "image_url"
+        for call in completions.calls
+    )
+
+
+def test_receipt_streamed_extraction():
+    completions = FakeStreamingCompletions()
+    receipt = Receipt(b"png", backend=OpenAIBackend(create_fake_client(completions)))
+
+    streamed_items = []
+    consumed_events = []
+    for item in receipt.stream_items():
+        streamed_items.append(item)
+        consumed_events.append(completions.last_stream.consumed)
+
+    assert streamed_items == EXPECTED_ITEMS.items
+    assert completions.calls[0]["response_format"] is ReceiptData
+    # Each item arrives while the rest of the receipt is still streaming
+    assert consumed_events == sorted(consumed_events)
+    assert consumed_events[0] < len(completions.last_stream.events) / 2
+    assert receipt.extract() == RECEIPT_DATA
+    assert len(completions.calls) == 1
+
+
+def test_receipt_chat_history_without_image():
+    image_data = b"png" * 100_000
+    completions = FakeCompletions()
+    receipt = Receipt(
+        image_data, backend=OpenAIBackend(create_fake_client(completions))
+    )
+
+    messages = receipt.start_analysis()
+    items, messages = receipt.get_items_with_chat(messages)
+    tax, messages = receipt.get_tax_with_chat(messages)
+
+    # The image is only sent to the model, not kept in the history
+    sent_url = completions.calls[0]["messages"][1]["content"][1]["image_url"]["url"]
+    assert sent_url == receipt.image_url
+    assert "base64" not in json.dumps(messages)
+
+    inline_messages = receipt.attach_image(messages)
+    assert len(json.dumps(inline_messages)) > len(image_data)
 
 
 def test_receipt_analysis_with_chat():
@@ -1,8 +1,18 @@
-from bill.receipts import Items, Item
+from bill.receipts import Items, Item, ReceiptData
 from pathlib import Path
+from types import SimpleNamespace
+import asyncio
+import os
+import pytest
 
 TEST_DATA_DIR = Path(__file__).parent / ".." / "bin"
 
+# Marks tests that assert wall-clock times, which only run with BILL_BENCHMARK set
+# as they are flaky on a loaded machine
+benchmark = pytest.mark.skipif(
+    not os.environ.get("BILL_BENCHMARK"), reason="timed, set BILL_BENCHMARK to run"
+)
+
 
 EXPECTED_ITEMS = Items(
     items=[
@@ -24,3 +34,126 @@ EXPECTED_ITEMS = Items(
         Item(name="Jus d Manguir", price=9.0),
     ]
 )
+
+
+RECEIPT_DATA = ReceiptData(
+    items=EXPECTED_ITEMS.items, subtotal=321.0, service_charge=64.2, tax=33.22
+)
+
+
+USAGE = SimpleNamespace(
+    prompt_tokens=1200,
+    completion_tokens=300,
+    prompt_tokens_details=SimpleNamespace(cached_tokens=1024),
+)
+
+
+class FakeCompletions:
+    """
+    Stands in for client.beta.chat.completions, answering every parse with RECEIPT_DATA.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def parse(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(parsed=RECEIPT_DATA)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=USAGE)
+
+
+class FakeStream:
+    """
+    Stands in for a structured output stream, sending RECEIPT_DATA one partial
+    parse at a time the way the SDK does, items first.
+    """
+
+    def __init__(self, events: list[SimpleNamespace]):
+        self.events = events
+        self.consumed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        for event in self.events:
+            self.consumed += 1
+            yield event
+
+    def get_final_completion(self):
+        message = SimpleNamespace(parsed=RECEIPT_DATA)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=USAGE)
+
+
+class FakeStreamingCompletions(FakeCompletions):
+    """
+    Stands in for client.beta.chat.completions, streaming RECEIPT_DATA.
+    """
+
+    def stream(self, **kwargs):
+        self.calls.append(kwargs)
+        self.last_stream = FakeStream(create_partial_events(RECEIPT_DATA))
+        return self.last_stream
+
+
+def create_partial_events(receipt_data: ReceiptData) -> list[SimpleNamespace]:
+    """
+    Get the content.delta events of streaming receipt_data, with the last item of
+    each partial parse cut off mid-way as it would be in a real stream.
+    """
+    items = [item.model_dump() for item in receipt_data.items]
+    events = []
+    for item_count, item in enumerate(items, start=1):
+        truncated_item = {"name": item["name"], "price": int(item["price"]) // 10}
+        for last_item in ({}, {"name": item["name"][:3]}, truncated_item):
+            parsed = {"items": items[: item_count - 1] + [last_item]}
+            events.append(SimpleNamespace(type="content.delta", parsed=parsed))
+    events.append(
+        SimpleNamespace(
+            type="content.delta",
+            parsed={"items": items, "subtotal": receipt_data.subtotal},
+        )
+    )
+    events.append(SimpleNamespace(type="content.done", parsed=receipt_data))
+    return events
+
+
+def create_fake_client(completions: FakeCompletions) -> SimpleNamespace:
+    return SimpleNamespace(
+        beta=SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    )
+
+
+class FakeAsyncCompletions:
+    """
+    Stands in for the async client.beta.chat.completions, answering each question
+    from RECEIPT_DATA after a delay. Records when each call starts and ends, so
+    tests can tell whether calls overlapped.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+        self.events = []
+
+    async def parse(self, **kwargs):
+        self.calls.append(kwargs)
+        self.events.append("start")
+        await asyncio.sleep(self.delay)
+        self.events.append("end")
+
+        question = kwargs["messages"][-1]["content"][0]["text"]
+        if kwargs["response_format"] is Items:
+            parsed = Items(items=RECEIPT_DATA.items)
+        elif "subtotal" in question:
+            parsed = Item(name="Subtotal", price=RECEIPT_DATA.subtotal)
+        elif "service charge" in question:
+            parsed = Item(name="Service charge", price=RECEIPT_DATA.service_charge)
+        else:
+            parsed = Item(name="Tax", price=RECEIPT_DATA.tax)
+
+        message = SimpleNamespace(parsed=parsed)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=USAGE)